@@ -1,5 +1,7 @@
 -- Enable pgvector extension
 CREATE EXTENSION IF NOT EXISTS vector;
+-- Trigram matching for fuzzy path, title and header lookup
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
 
 -- Create documents table
 CREATE TABLE documents (
@@ -24,28 +26,25 @@ CREATE TABLE document_chunks (
 );
 
 -- Create indexes for efficient searching
+-- (VECTOR_METRIC=ip uses a vector_ip_ops index instead: migrations/001_vector_ip_index.sql;
+-- large corpora can hash-partition document_chunks: migrations/002_partition_document_chunks.sql)
 CREATE INDEX ON document_chunks USING ivfflat (embedding vector_cosine_ops) WITH (lists = 100);
 CREATE INDEX ON document_chunks (document_id);
 CREATE INDEX ON documents (file_path);
 CREATE INDEX ON documents USING GIN (metadata);
 
 -- Create full-text search index
-ALTER TABLE document_chunks ADD COLUMN content_tsvector tsvector;
+-- (a stored generated column: computed by the insert itself, without a
+-- per-row trigger call; the document title (A) and section header (B),
+-- which the processor stores in chunk metadata, outrank body text (C))
+ALTER TABLE document_chunks ADD COLUMN content_tsvector tsvector
+    GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(metadata->>'title', '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(metadata->>'header', '')), 'B') ||
+        setweight(to_tsvector('english', content), 'C')
+    ) STORED;
 CREATE INDEX ON document_chunks USING GIN (content_tsvector);
 
--- Function to update tsvector automatically
-CREATE OR REPLACE FUNCTION update_content_tsvector() RETURNS trigger AS $$
-BEGIN
-    NEW.content_tsvector := to_tsvector('english', NEW.content);
-    RETURN NEW;
-END;
-$$ LANGUAGE plpgsql;
-
--- Trigger to automatically update tsvector
-CREATE TRIGGER update_content_tsvector_trigger
-    BEFORE INSERT OR UPDATE ON document_chunks
-    FOR EACH ROW EXECUTE FUNCTION update_content_tsvector();
-
 -- Create updated_at trigger function
 CREATE OR REPLACE FUNCTION update_updated_at_column()
 RETURNS TRIGGER AS $$
@@ -66,6 +65,11 @@ CREATE INDEX idx_documents_updated_at ON documents (updated_at);
 CREATE INDEX idx_document_chunks_created_at ON document_chunks (created_at);
 CREATE INDEX idx_document_chunks_chunk_index ON document_chunks (document_id, chunk_index);
 
+-- Trigram indexes for /search/fuzzy (word similarity, <%)
+CREATE INDEX documents_file_path_trgm_idx ON documents USING GIN (file_path gin_trgm_ops);
+CREATE INDEX documents_title_trgm_idx ON documents USING GIN (title gin_trgm_ops);
+CREATE INDEX document_chunks_header_trgm_idx ON document_chunks USING GIN ((metadata->>'header') gin_trgm_ops);
+
 -- Create a view for easy document search with chunk count
 CREATE VIEW document_search_view AS
 SELECT 
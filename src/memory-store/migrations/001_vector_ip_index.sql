@@ -0,0 +1,32 @@
+-- Inner-product vector search (VECTOR_METRIC=ip)
+--
+-- The embedding service returns unit vectors, for which the inner product
+-- equals cosine similarity, so <#> ranks exactly like <=> without
+-- normalizing both vectors on every comparison. This adds the
+-- vector_ip_ops index that <#> queries need.
+--
+-- Apply to an existing database (outside a transaction, for CONCURRENTLY):
+--
+--   psql "$DATABASE_URL" -f migrations/001_vector_ip_index.sql
+--
+-- Then set VECTOR_METRIC=ip for the search API and document processor.
+-- The cosine index can be dropped once nothing queries with <=>.
+--
+-- Indexes cannot be built concurrently on a partitioned table. After
+-- 002_partition_document_chunks.sql this migration only normalizes the
+-- vectors; build the per-partition ip indexes with
+--
+--   VECTOR_METRIC=ip python services/processor/maintain_chunks.py build-indexes --jobs 4
+
+-- Rescale any stored vectors that are not unit length (pgvector >= 0.7)
+UPDATE document_chunks
+SET embedding = l2_normalize(embedding)
+WHERE embedding IS NOT NULL AND abs(vector_norm(embedding) - 1) > 1e-4;
+
+-- psql's \gexec runs the statement only on an unpartitioned table
+SELECT 'CREATE INDEX CONCURRENTLY IF NOT EXISTS document_chunks_embedding_ip_idx
+    ON document_chunks USING ivfflat (embedding vector_ip_ops) WITH (lists = 100)'
+WHERE (SELECT relkind FROM pg_class WHERE oid = 'document_chunks'::regclass) <> 'p'
+\gexec
+
+ANALYZE document_chunks;
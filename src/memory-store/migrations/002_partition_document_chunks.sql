@@ -0,0 +1,91 @@
+-- Hash-partition document_chunks by document_id
+--
+-- Replaces the single document_chunks heap with 8 hash partitions
+-- (document_chunks_p0 .. document_chunks_p7) so vacuum, reindex and ANN
+-- index builds run per partition, in parallel, without locking search on
+-- the whole table. Queries and inserts keep using document_chunks; the
+-- search API fans semantic searches out across the partitions.
+--
+-- Apply, then build the per-partition indexes in parallel:
+--
+--   psql "$DATABASE_URL" -f migrations/002_partition_document_chunks.sql
+--   python services/processor/maintain_chunks.py build-indexes --jobs 4
+--
+-- The old table is kept as document_chunks_unpartitioned until dropped.
+
+BEGIN;
+
+DROP VIEW IF EXISTS document_search_view;
+
+ALTER TABLE document_chunks RENAME TO document_chunks_unpartitioned;
+
+-- The embedding column keeps the old table's type, so a database embedded
+-- with a model of another dimension migrates unchanged
+DO $$
+BEGIN
+    EXECUTE format($sql$
+        CREATE TABLE document_chunks (
+            id INTEGER NOT NULL DEFAULT nextval('document_chunks_id_seq'),
+            document_id INTEGER NOT NULL REFERENCES documents(id) ON DELETE CASCADE,
+            chunk_index INTEGER NOT NULL,
+            content TEXT NOT NULL,
+            embedding %s,
+            metadata JSONB,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            content_tsvector tsvector GENERATED ALWAYS AS (
+                setweight(to_tsvector('english', coalesce(metadata->>'title', '')), 'A') ||
+                setweight(to_tsvector('english', coalesce(metadata->>'header', '')), 'B') ||
+                setweight(to_tsvector('english', content), 'C')
+            ) STORED,
+            -- Unique constraints on a partitioned table must include the partition key
+            PRIMARY KEY (id, document_id)
+        ) PARTITION BY HASH (document_id)
+    $sql$, (
+        SELECT format_type(atttypid, atttypmod)
+        FROM pg_attribute
+        WHERE attrelid = 'document_chunks_unpartitioned'::regclass AND attname = 'embedding'
+    ));
+END $$;
+
+ALTER SEQUENCE document_chunks_id_seq OWNED BY document_chunks.id;
+
+DO $$
+BEGIN
+    FOR i IN 0..7 LOOP
+        EXECUTE format(
+            'CREATE TABLE document_chunks_p%s PARTITION OF document_chunks '
+            'FOR VALUES WITH (MODULUS 8, REMAINDER %s)', i, i
+        );
+    END LOOP;
+END $$;
+
+-- content_tsvector weights the document title from chunk metadata; chunks
+-- written before the processor stored it get documents.title
+INSERT INTO document_chunks
+    (id, document_id, chunk_index, content, embedding, metadata, created_at)
+SELECT dc.id, dc.document_id, dc.chunk_index, dc.content, dc.embedding,
+    CASE
+        WHEN d.title IS NULL OR COALESCE(dc.metadata ? 'title', false) THEN dc.metadata
+        ELSE COALESCE(dc.metadata, '{}'::jsonb) || jsonb_build_object('title', d.title)
+    END,
+    dc.created_at
+FROM document_chunks_unpartitioned dc
+JOIN documents d ON d.id = dc.document_id;
+
+CREATE VIEW document_search_view AS
+SELECT 
+    d.id,
+    d.file_path,
+    d.title,
+    d.content,
+    d.metadata,
+    d.created_at,
+    d.updated_at,
+    COUNT(dc.id) as chunk_count
+FROM documents d
+LEFT JOIN document_chunks dc ON d.id = dc.document_id
+GROUP BY d.id, d.file_path, d.title, d.content, d.metadata, d.created_at, d.updated_at;
+
+COMMIT;
+
+ANALYZE document_chunks;
@@ -0,0 +1,46 @@
+-- Replace the content_tsvector trigger with a stored generated column
+--
+-- The BEFORE INSERT OR UPDATE trigger called a plpgsql function for every
+-- chunk row, and recomputed the tsvector on metadata-only updates. A
+-- GENERATED ALWAYS AS ... STORED column is computed by the insert itself,
+-- without a plpgsql call, and an UPDATE recomputes it only when a column it
+-- reads changes. Here that is content alone; 004 weights in the title and
+-- header from metadata, so from then on metadata updates recompute it too
+-- (bench_tsvector.py measures both). Rewrites document_chunks once; run in a
+-- maintenance window. Databases created from the current init.sql (or
+-- migrated with 002) already have the generated column and are skipped.
+--
+-- On a partitioned document_chunks, rebuild the full-text indexes
+-- afterwards, in parallel per partition:
+--
+--   python services/processor/maintain_chunks.py build-indexes --jobs 4
+
+BEGIN;
+
+-- CASCADE also drops the trigger left on document_chunks_unpartitioned by 002
+DROP FUNCTION IF EXISTS update_content_tsvector() CASCADE;
+
+DO $$
+BEGIN
+    IF EXISTS (
+        SELECT 1 FROM pg_attribute
+        WHERE attrelid = 'document_chunks'::regclass
+          AND attname = 'content_tsvector' AND attgenerated = 's'
+    ) THEN
+        RAISE NOTICE 'document_chunks.content_tsvector is already a generated column';
+        RETURN;
+    END IF;
+
+    -- Dropping the column drops its GIN index(es) too
+    ALTER TABLE document_chunks DROP COLUMN content_tsvector;
+    ALTER TABLE document_chunks ADD COLUMN content_tsvector tsvector
+        GENERATED ALWAYS AS (to_tsvector('english', content)) STORED;
+
+    IF (SELECT relkind FROM pg_class WHERE oid = 'document_chunks'::regclass) <> 'p' THEN
+        CREATE INDEX document_chunks_content_tsvector_idx ON document_chunks USING GIN (content_tsvector);
+    END IF;
+END $$;
+
+COMMIT;
+
+ANALYZE document_chunks;
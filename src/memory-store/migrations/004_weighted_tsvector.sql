@@ -0,0 +1,65 @@
+-- Weight content_tsvector by document title (A), section header (B) and body (C)
+--
+-- Redefines the generated content_tsvector column so full-text search can
+-- rank title and header matches above body matches with ts_rank_cd. The
+-- title comes from chunk metadata, which the processor now fills in;
+-- existing chunks get it from documents.title here. Rewrites
+-- document_chunks once; run in a maintenance window. If the column is
+-- already weighted only the missing titles are filled in.
+--
+-- On a partitioned document_chunks, rebuild the full-text indexes
+-- afterwards, in parallel per partition:
+--
+--   python services/processor/maintain_chunks.py build-indexes --jobs 4
+
+BEGIN;
+
+-- CASCADE also drops the trigger left on document_chunks_unpartitioned by 002
+DROP FUNCTION IF EXISTS update_content_tsvector() CASCADE;
+
+DO $$
+DECLARE
+    weighted BOOLEAN;
+BEGIN
+    SELECT EXISTS (
+        SELECT 1 FROM pg_attrdef ad
+        JOIN pg_attribute a ON a.attrelid = ad.adrelid AND a.attnum = ad.adnum
+        WHERE ad.adrelid = 'document_chunks'::regclass
+          AND a.attname = 'content_tsvector'
+          AND pg_get_expr(ad.adbin, ad.adrelid) LIKE '%setweight%'
+    ) INTO weighted;
+
+    -- Dropping the column drops its GIN index(es) too, and keeps the title
+    -- backfill below from recomputing the old tsvector
+    IF NOT weighted THEN
+        ALTER TABLE document_chunks DROP COLUMN content_tsvector;
+    END IF;
+
+    -- Also runs on an already weighted column (e.g. one created by 002), so
+    -- chunks copied without a title get one
+    UPDATE document_chunks dc
+    SET metadata = COALESCE(dc.metadata, '{}'::jsonb) || jsonb_build_object('title', d.title)
+    FROM documents d
+    WHERE d.id = dc.document_id
+      AND d.title IS NOT NULL
+      AND NOT COALESCE(dc.metadata ? 'title', false);
+
+    IF weighted THEN
+        RAISE NOTICE 'document_chunks.content_tsvector is already weighted';
+        RETURN;
+    END IF;
+
+    ALTER TABLE document_chunks ADD COLUMN content_tsvector tsvector GENERATED ALWAYS AS (
+        setweight(to_tsvector('english', coalesce(metadata->>'title', '')), 'A') ||
+        setweight(to_tsvector('english', coalesce(metadata->>'header', '')), 'B') ||
+        setweight(to_tsvector('english', content), 'C')
+    ) STORED;
+
+    IF (SELECT relkind FROM pg_class WHERE oid = 'document_chunks'::regclass) <> 'p' THEN
+        CREATE INDEX document_chunks_content_tsvector_idx ON document_chunks USING GIN (content_tsvector);
+    END IF;
+END $$;
+
+COMMIT;
+
+ANALYZE document_chunks;
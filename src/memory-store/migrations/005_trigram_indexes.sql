@@ -0,0 +1,29 @@
+-- Trigram indexes for fuzzy file path, title and header lookup
+--
+-- Backs /search/fuzzy, which matches queries with typos against
+-- documents.file_path, documents.title and chunk section headers using
+-- pg_trgm word similarity (<%) over GIN gin_trgm_ops indexes. Run outside
+-- a transaction: CREATE INDEX CONCURRENTLY keeps the tables writable.
+--
+-- On a partitioned document_chunks, build the header index per partition,
+-- in parallel, instead:
+--
+--   python services/processor/maintain_chunks.py build-indexes --jobs 4
+
+CREATE EXTENSION IF NOT EXISTS pg_trgm;
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_file_path_trgm_idx
+    ON documents USING GIN (file_path gin_trgm_ops);
+CREATE INDEX CONCURRENTLY IF NOT EXISTS documents_title_trgm_idx
+    ON documents USING GIN (title gin_trgm_ops);
+
+DO $$
+BEGIN
+    IF (SELECT relkind FROM pg_class WHERE oid = 'document_chunks'::regclass) <> 'p' THEN
+        CREATE INDEX IF NOT EXISTS document_chunks_header_trgm_idx
+            ON document_chunks USING GIN ((metadata->>'header') gin_trgm_ops);
+    END IF;
+END $$;
+
+ANALYZE documents;
+ANALYZE document_chunks;
@@ -0,0 +1,113 @@
+"""
+Prometheus metrics for the search API, served at /metrics and summarized
+per process in /stats.
+
+Run under several worker processes, set PROMETHEUS_MULTIPROC_DIR (empty,
+before start) so /metrics reports the sum over all of them.
+"""
+
+import os
+import time
+
+from typing import Any, Dict
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from prometheus_client.utils import floatToGoString
+from starlette.requests import Request
+from starlette.responses import Response
+
+# Seconds; the last bucket (+Inf) catches everything slower
+DEFAULT_BUCKETS = (0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0)
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+REQUESTS = Counter(
+    "search_api_http_requests_total", "HTTP requests by endpoint and status", ["method", "endpoint", "status"])
+REQUEST_SECONDS = Histogram(
+    "search_api_http_request_seconds", "HTTP request latency by endpoint", ["method", "endpoint"],
+    buckets=DEFAULT_BUCKETS)
+IN_PROGRESS = Gauge(
+    "search_api_http_requests_in_progress", "Requests being served, including those waiting for the pool",
+    multiprocess_mode="livesum")
+
+SEARCHES = Counter(
+    "search_api_searches_total", "Search calls by mode, run or coalesced into an identical in-flight one",
+    ["mode", "result"])
+QUERY_SECONDS = Histogram(
+    "search_api_query_seconds", "Search SQL execution time by mode", ["mode"], buckets=DEFAULT_BUCKETS)
+QUERY_TIMEOUTS = Counter("search_api_query_timeouts_total", "Search queries cancelled at the mode's timeout", ["mode"])
+EMBEDDING_SECONDS = Histogram(
+    "search_api_embedding_request_seconds", "Query embedding calls to the embedding service",
+    buckets=DEFAULT_BUCKETS)
+RERANKS = Counter("search_api_reranks_total", "Hybrid rerank attempts by outcome", ["outcome"])
+
+POOL_WAIT_SECONDS = Histogram(
+    "search_api_pool_wait_seconds", "Time waiting for a database connection", buckets=DEFAULT_BUCKETS)
+POOL_ACQUIRE_TIMEOUTS = Counter(
+    "search_api_pool_acquire_timeouts_total", "Requests shed with 503 after waiting for a connection")
+POOL_SIZE = Gauge("search_api_pool_size", "Open database connections", multiprocess_mode="livesum")
+POOL_IDLE = Gauge("search_api_pool_idle", "Idle database connections", multiprocess_mode="livesum")
+
+
+async def record_request(request: Request, call_next):
+    """HTTP middleware: count and time requests by route template"""
+    IN_PROGRESS.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        endpoint = route.path if route else "unmatched"
+        REQUESTS.labels(request.method, endpoint, str(status)).inc()
+        REQUEST_SECONDS.labels(request.method, endpoint).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
+
+
+def value(name: str, **labels: str) -> float:
+    """This process's value of a counter or gauge sample"""
+    return REGISTRY.get_sample_value(name, labels) or 0.0
+
+
+def histogram_snapshot(name: str, **labels: str) -> Dict[str, Any]:
+    """
+    This process's observations of a DEFAULT_BUCKETS histogram, for /stats.
+    Quantiles are the upper bound of the bucket holding them (None past the
+    last finite bucket), so they are estimates with the buckets' resolution.
+    """
+    bounds = [floatToGoString(bound) for bound in DEFAULT_BUCKETS] + ["+Inf"]
+    buckets = {bound: value(f"{name}_bucket", le=bound, **labels) for bound in bounds}
+    count = value(f"{name}_count", **labels)
+    total = value(f"{name}_sum", **labels)
+
+    def quantile(q: float):
+        for bound, seen in buckets.items():
+            if count and seen >= q * count:
+                return float(bound) if bound != "+Inf" else None
+        return 0.0
+
+    return {
+        "count": int(count),
+        "sum": round(total, 3),
+        "avg": round(total / count, 4) if count else 0.0,
+        "p50": quantile(0.5),
+        "p95": quantile(0.95),
+        "p99": quantile(0.99),
+        # Cumulative: observations <= each bound
+        "buckets": {bound: int(seen) for bound, seen in buckets.items()},
+    }
@@ -1,18 +1,79 @@
+import asyncio
+import contextlib
+import functools
+import heapq
+import itertools
 import json
 import logging
 import os
-from typing import List, Dict, Any, Union
+import random
+import re
+import time
+from typing import List, Dict, Any, Literal, Optional, Tuple, Union
 
 import asyncpg
 import httpx
-from fastapi import FastAPI, HTTPException, Query, Depends
+from fastapi import FastAPI, HTTPException, Query, Depends, Response
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel, field_validator
 from contextlib import asynccontextmanager
 
+import metrics
+import tracing
+from single_flight import SingleFlight
+from vector_index import LocalVectorIndex, mmr_select
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
+# Sampled EXPLAIN (ANALYZE, BUFFERS) plans, one JSON object per line
+explain_logger = logging.getLogger(f"{__name__}.explain")
+
+# Full-text query syntaxes: plain words (all must match), web search syntax
+# ("quoted phrases", or, -negation), or word prefixes for search-as-you-type
+TsquerySyntax = Literal["plain", "websearch", "prefix"]
+TSQUERY_FUNCTIONS = {
+    "plain": "plainto_tsquery",
+    "websearch": "websearch_to_tsquery",
+    "prefix": "to_tsquery",
+}
+
+
+# Search modes; each has its own query timeout and latency histogram
+SEARCH_MODES = ("semantic", "fulltext", "fuzzy", "hybrid")
+DEFAULT_QUERY_TIMEOUTS = {"semantic": 5.0, "fulltext": 5.0, "fuzzy": 2.0, "hybrid": 10.0}
+
+
+# Collapsing: at most one result (the best chunk) per document
+Collapse = Literal["document"]
+
+
+def prefix_tsquery(query: str) -> str:
+    """to_tsquery input matching every word of query as a prefix: 'depl clus' -> 'depl:* & clus:*'"""
+    return ' & '.join(f"{word}:*" for word in re.findall(r"[^\W_]+", query))
+
+
+def coalesced(mode: str):
+    """
+    Run concurrent identical calls of a SearchAPI search method once.
+
+    Calls are identical when their mode and arguments match. Every caller
+    gets its own copies of the result rows, since endpoints edit them.
+    """
+    def decorator(method):
+        @functools.wraps(method)
+        async def wrapper(self, *args, **kwargs):
+            if not self.single_flight:
+                metrics.SEARCHES.labels(mode, "run").inc()
+                return await method(self, *args, **kwargs)
+            key = (mode, args, tuple(sorted(kwargs.items())))
+            shared = key in self.single_flight
+            metrics.SEARCHES.labels(mode, "coalesced" if shared else "run").inc()
+            with tracing.span("coalesced") if shared else contextlib.nullcontext():
+                rows = await self.single_flight.do(key, lambda: method(self, *args, **kwargs))
+            return [dict(row) for row in rows]
+        return wrapper
+    return decorator
 
 
 class SearchResult(BaseModel):
@@ -21,6 +82,8 @@ class SearchResult(BaseModel):
     content: str
     metadata: Dict[str, Any]
     similarity: float
+    chunk_id: Optional[int] = None
+    rerank_score: Optional[float] = None
 
     @field_validator('metadata', mode='before')
     @classmethod
@@ -34,7 +97,8 @@ class SearchResult(BaseModel):
             if not v.strip():  # Empty or whitespace-only string
                 return {}
             try:
-                return json.loads(v)
+                with tracing.span("metadata"):
+                    return json.loads(v)
             except json.JSONDecodeError:
                 logger.warning(f"Invalid JSON in metadata field: {v}")
                 return {}
@@ -45,6 +109,8 @@ class SearchResponse(BaseModel):
     results: List[SearchResult]
     count: int
     query: str
+    # With debug=true: milliseconds per phase (see tracing.PHASES)
+    debug: Optional[Dict[str, Any]] = None
 
 
 class SearchAPI:
@@ -60,17 +126,95 @@ class SearchAPI:
         )
         self.max_results = int(os.getenv("MAX_RESULTS", "20"))
         self.similarity_threshold = float(os.getenv("SIMILARITY_THRESHOLD", "0.7"))
+        # Minimum pg_trgm word similarity for /search/fuzzy matches
+        self.fuzzy_threshold = float(os.getenv("FUZZY_THRESHOLD", "0.5"))
+        # Queries must be embedded with the model the documents were embedded with
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        # Stored embeddings are unit vectors, so "ip" (inner product, <#>)
+        # ranks like "cosine" (<=>) without renormalizing per comparison; it
+        # needs the vector_ip_ops index from migrations/001_vector_ip_index.sql
+        self.vector_metric = os.getenv("VECTOR_METRIC", "cosine")
+        if self.vector_metric not in ("cosine", "ip"):
+            raise ValueError(f"Unsupported VECTOR_METRIC: {self.vector_metric}")
+        # With a partitioned document_chunks (migrations/002), run semantic
+        # search per partition in parallel and merge the per-partition top-k.
+        # Each partition query holds a pooled connection, so a search holds at
+        # most SEARCH_PARTITION_CONCURRENCY of them at once
+        self.partition_fanout = os.getenv("SEARCH_PARTITION_FANOUT", "false").lower() == "true"
+        self.partition_concurrency = max(1, int(os.getenv("SEARCH_PARTITION_CONCURRENCY", "2")))
+        self.chunk_partitions: List[str] = []
+        # Answer semantic searches from an in-process copy of the embeddings,
+        # fetching only the resulting rows from Postgres
+        self.local_index = None
+        if os.getenv("LOCAL_VECTOR_INDEX", "false").lower() == "true":
+            self.local_index = LocalVectorIndex(
+                refresh_interval=float(os.getenv("LOCAL_VECTOR_INDEX_REFRESH", "10")),
+                reload_interval=float(os.getenv("LOCAL_VECTOR_INDEX_RELOAD", "3600")),
+                # Shared with the processor, which publishes it after ingest runs
+                snapshot_path=os.getenv("EMBEDDING_SNAPSHOT_PATH", "")
+            )
+        self.local_index_task = None
+        # Candidates considered per requested result by collapse and MMR
+        self.diversity_candidates = int(os.getenv("DIVERSITY_CANDIDATES", "5"))
+        # Hybrid rerank: fused candidates sent to the embedding service's
+        # cross-encoder, how much of each chunk it reads, and the time after
+        # which results fall back to the fused order
+        self.rerank_candidates = int(os.getenv("RERANK_CANDIDATES", "50"))
+        self.rerank_snippet_chars = int(os.getenv("RERANK_SNIPPET_CHARS", "1000"))
+        self.rerank_budget = float(os.getenv("RERANK_BUDGET_MS", "300")) / 1000
+        # Identical concurrent searches share one query
+        self.single_flight = None
+        if os.getenv("SEARCH_SINGLE_FLIGHT", "true").lower() == "true":
+            self.single_flight = SingleFlight()
+        # Connection pool; requests that wait longer than DB_POOL_ACQUIRE_TIMEOUT
+        # for a connection get 503 with Retry-After instead of queueing
+        self.pool_min_size = int(os.getenv("DB_POOL_MIN_SIZE", "2"))
+        self.pool_max_size = int(os.getenv("DB_POOL_MAX_SIZE", "10"))
+        self.command_timeout = float(os.getenv("DB_COMMAND_TIMEOUT", "30"))
+        self.pool_acquire_timeout = float(os.getenv("DB_POOL_ACQUIRE_TIMEOUT", "1"))
+        self.pool_retry_after = int(os.getenv("DB_POOL_RETRY_AFTER", "1"))
+        # ANN search breadth per connection (empty = pgvector's default):
+        # ivfflat lists scanned, and the HNSW candidate list size
+        self.ivfflat_probes = os.getenv("IVFFLAT_PROBES", "")
+        self.hnsw_ef_search = os.getenv("HNSW_EF_SEARCH", "")
+        # Per-mode query timeouts (seconds), e.g. SEARCH_TIMEOUT_HYBRID=10
+        self.query_timeouts = {
+            mode: float(os.getenv(f"SEARCH_TIMEOUT_{mode.upper()}", str(DEFAULT_QUERY_TIMEOUTS[mode])))
+            for mode in SEARCH_MODES
+        }
         self.pool = None
+        # Request timings: always send Server-Timing, not only with debug=true
+        self.server_timing = os.getenv("SEARCH_SERVER_TIMING", "false").lower() == "true"
+        # EXPLAIN (ANALYZE, BUFFERS) a sampled fraction of the search queries
+        # that took at least EXPLAIN_MIN_MS, re-running them in the background
+        # one at a time, and log the plans (to EXPLAIN_LOG_PATH if set)
+        self.explain_sample_rate = float(os.getenv("EXPLAIN_SAMPLE_RATE", "0"))
+        self.explain_min_ms = float(os.getenv("EXPLAIN_MIN_MS", "0"))
+        self.explain_task = None
+        explain_log_path = os.getenv("EXPLAIN_LOG_PATH", "")
+        if explain_log_path and not explain_logger.handlers:
+            handler = logging.FileHandler(explain_log_path)
+            handler.setFormatter(logging.Formatter("%(message)s"))
+            explain_logger.addHandler(handler)
+            explain_logger.propagate = False
         self.http_client = None
     
     async def initialize(self):
         """Initialize async resources"""
+        # Threshold used by the <% operator (and its trigram index scans)
+        server_settings = {"pg_trgm.word_similarity_threshold": str(self.fuzzy_threshold)}
+        if self.ivfflat_probes:
+            server_settings["ivfflat.probes"] = self.ivfflat_probes
+        if self.hnsw_ef_search:
+            server_settings["hnsw.ef_search"] = self.hnsw_ef_search
+        
         # Create database connection pool
         self.pool = await asyncpg.create_pool(
             self.db_url,
-            min_size=2,
-            max_size=10,
-            command_timeout=30
+            min_size=self.pool_min_size,
+            max_size=self.pool_max_size,
+            command_timeout=self.command_timeout,
+            server_settings=server_settings
         )
         
         # Create HTTP client for embeddings
@@ -78,9 +222,96 @@ class SearchAPI:
         
         # Verify database
         await self._verify_database()
+        
+        if self.local_index:
+            await self.local_index.load(self.pool)
+            self.local_index_task = asyncio.create_task(self.local_index.run_refresh(self.pool))
+    
+    @asynccontextmanager
+    async def acquire(self):
+        """Pool connection, recording how long the request waited for it; 503 past the wait budget"""
+        start = time.perf_counter()
+        try:
+            conn = await self.pool.acquire(timeout=self.pool_acquire_timeout)
+        except asyncio.TimeoutError:
+            wait = time.perf_counter() - start
+            metrics.POOL_ACQUIRE_TIMEOUTS.inc()
+            metrics.POOL_WAIT_SECONDS.observe(wait)
+            logger.warning(f"No database connection within {self.pool_acquire_timeout}s, shedding request")
+            raise HTTPException(status_code=503, detail="Search is overloaded, retry shortly",
+                                headers={"Retry-After": str(self.pool_retry_after)})
+        wait = time.perf_counter() - start
+        metrics.POOL_WAIT_SECONDS.observe(wait)
+        tracing.add("pool", wait)
+        metrics.POOL_SIZE.set(self.pool.get_size())
+        metrics.POOL_IDLE.set(self.pool.get_idle_size())
+        try:
+            yield conn
+        finally:
+            await self.pool.release(conn)
+    
+    async def _fetch(self, mode: str, sql: str, *args) -> List[asyncpg.Record]:
+        """Run one search query on a pooled connection, within the mode's timeout"""
+        async with self.acquire() as conn:
+            start = time.perf_counter()
+            try:
+                rows = await conn.fetch(sql, *args, timeout=self.query_timeouts[mode])
+            except asyncio.TimeoutError:
+                # asyncpg has already asked the server to cancel the query
+                metrics.QUERY_TIMEOUTS.labels(mode).inc()
+                logger.warning(f"{mode} search query exceeded {self.query_timeouts[mode]}s")
+                raise HTTPException(status_code=504, detail="Search timed out")
+            finally:
+                duration = time.perf_counter() - start
+                metrics.QUERY_SECONDS.labels(mode).observe(duration)
+                tracing.add("sql", duration)
+        
+        if (self.explain_sample_rate and duration * 1000 >= self.explain_min_ms
+                and random.random() < self.explain_sample_rate
+                and (self.explain_task is None or self.explain_task.done())):
+            self.explain_task = asyncio.create_task(self._explain(mode, sql, args, duration))
+        return rows
+    
+    async def _explain(self, mode: str, sql: str, args: tuple, duration: float):
+        """Re-run a sampled query under EXPLAIN (ANALYZE, BUFFERS) and log its plan"""
+        try:
+            async with self.pool.acquire() as conn:
+                plan = await conn.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", *args,
+                                           timeout=self.query_timeouts[mode])
+            explain_logger.info(json.dumps({
+                "time": time.time(),
+                "mode": mode,
+                "duration_ms": round(duration * 1000, 3),
+                "sql": " ".join(sql.split()),
+                "plan": json.loads(plan) if isinstance(plan, str) else plan,
+            }))
+        except Exception as e:
+            logger.warning(f"EXPLAIN of sampled {mode} query failed: {e!r}")
+    
+    def pool_stats(self) -> Dict[str, Any]:
+        return {
+            "size": self.pool.get_size(),
+            "idle": self.pool.get_idle_size(),
+            "min_size": self.pool.get_min_size(),
+            "max_size": self.pool.get_max_size(),
+            "acquire_timeouts": int(metrics.value("search_api_pool_acquire_timeouts_total")),
+            "wait_seconds": metrics.histogram_snapshot("search_api_pool_wait_seconds"),
+        }
+    
+    def query_stats(self) -> Dict[str, Any]:
+        return {
+            mode: {
+                "timeout": self.query_timeouts[mode],
+                "timeouts": int(metrics.value("search_api_query_timeouts_total", mode=mode)),
+                "seconds": metrics.histogram_snapshot("search_api_query_seconds", mode=mode),
+            }
+            for mode in SEARCH_MODES
+        }
     
     async def close(self):
         """Clean up async resources"""
+        if self.local_index_task:
+            self.local_index_task.cancel()
         if self.pool:
             await self.pool.close()
         if self.http_client:
@@ -88,7 +319,7 @@ class SearchAPI:
     
     async def _verify_database(self):
         """Verify database connection and schema"""
-        async with self.pool.acquire() as conn:
+        async with self.acquire() as conn:
             # Check pgvector extension
             result = await conn.fetchval("SELECT EXISTS(SELECT 1 FROM pg_extension WHERE extname = 'vector')")
             if not result:
@@ -105,6 +336,27 @@ class SearchAPI:
                 """, table)
                 if not exists:
                     raise Exception(f"Required table '{table}' not found")
+            
+            if self.vector_metric == "ip":
+                has_ip_index = await conn.fetchval("""
+                    SELECT EXISTS(
+                        SELECT 1 FROM pg_indexes
+                        WHERE tablename = 'document_chunks' AND indexdef LIKE '%vector_ip_ops%'
+                    )
+                """)
+                if not has_ip_index:
+                    logger.warning("VECTOR_METRIC=ip but document_chunks has no vector_ip_ops index; "
+                                   "apply migrations/001_vector_ip_index.sql")
+
+            # regclass::text quotes the names where needed, for use in SQL
+            self.chunk_partitions = [row[0] for row in await conn.fetch("""
+                SELECT inhrelid::regclass::text FROM pg_inherits
+                WHERE inhparent = 'document_chunks'::regclass
+                ORDER BY 1
+            """)]
+            if self.chunk_partitions:
+                fanout = f"on, {self.partition_concurrency} at a time" if self.partition_fanout else "off"
+                logger.info(f"document_chunks has {len(self.chunk_partitions)} partitions (fan-out {fanout})")
         
         logger.info("Database connection verified")
     
@@ -116,11 +368,12 @@ class SearchAPI:
         )
         payload = {
             "texts": [text],
-            "model_name": "all-MiniLM-L6-v2", 
+            "model_name": self.embedding_model,
         }
         
         try:
-            response = await self.http_client.post(f"{url}/embeddings", json=payload)
+            with metrics.EMBEDDING_SECONDS.time(), tracing.span("embed"):
+                response = await self.http_client.post(f"{url}/embeddings", json=payload)
             response.raise_for_status()
             
             data = response.json()
@@ -136,110 +389,397 @@ class SearchAPI:
             logger.error(f"Error processing embedding response: {e}")
             raise HTTPException(status_code=500, detail="Failed to process embedding")
     
-    async def semantic_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def rerank(self, query: str, rows: List[Dict[str, Any]], limit: int) -> List[Dict[str, Any]]:
+        """
+        Reorder rows by cross-encoder score, keeping the top limit.
+
+        The embedding service stops scoring at the budget; if it cannot
+        score every row in time (or the request fails or runs over), the
+        rows keep their original order, so reranking never costs more than
+        the budget.
+        """
+        if len(rows) < 2:
+            return rows[:limit]
+        url = os.getenv("EMBEDDINGS_URL", "http://localhost:8001")
+        payload = {
+            "query": query,
+            "documents": [row['content'][:self.rerank_snippet_chars] for row in rows],
+            # Leave part of the budget for the round trip
+            "budget_ms": self.rerank_budget * 1000 * 0.8,
+        }
+        try:
+            # httpx timeouts bound each connect/read/write, not the whole call
+            with tracing.span("rerank"):
+                response = await asyncio.wait_for(
+                    self.http_client.post(f"{url}/rerank", json=payload), self.rerank_budget)
+            response.raise_for_status()
+            data = response.json()
+        except (httpx.HTTPError, ValueError, asyncio.TimeoutError) as e:
+            metrics.RERANKS.labels("error").inc()
+            logger.warning(f"Rerank unavailable, keeping fused order: {e!r}")
+            return rows[:limit]
+        if not data.get("complete"):
+            metrics.RERANKS.labels("budget_exhausted").inc()
+            logger.warning(f"Rerank budget exhausted after {sum(s is not None for s in data['scores'])}"
+                           f"/{len(rows)} candidates, keeping fused order")
+            return rows[:limit]
+
+        metrics.RERANKS.labels("reranked").inc()
+        for row, score in zip(rows, data["scores"]):
+            row['rerank_score'] = score
+        return sorted(rows, key=lambda row: row['rerank_score'], reverse=True)[:limit]
+    
+    def _vector_sql(self, param: str) -> Tuple[str, str]:
+        """(distance, similarity) SQL for dc.embedding against a query vector parameter"""
+        if self.vector_metric == "ip":
+            # <#> is the negative inner product, i.e. -cosine for unit vectors
+            distance = f"dc.embedding <#> {param}::vector"
+            return distance, f"-({distance})"
+        distance = f"dc.embedding <=> {param}::vector"
+        return distance, f"1 - ({distance})"
+    
+    @coalesced("semantic")
+    async def semantic_search(self, query: str, limit: int = 10, collapse: Optional[Collapse] = None,
+                              mmr: bool = False, mmr_lambda: float = 0.7) -> List[Dict[str, Any]]:
         """Perform semantic search using vector similarity"""
         try:
             # Generate query embedding
             query_embedding = await self.generate_embedding(query)
+            if collapse or mmr:
+                return await self._diverse_semantic_search(query_embedding, limit, collapse, mmr, mmr_lambda)
+            if self.local_index and self.local_index.ready:
+                return await self._local_semantic_search(query_embedding, limit)
             embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'        
+            if self.partition_fanout and self.chunk_partitions:
+                return await self._partitioned_semantic_search(embedding_str, limit)
+            distance, similarity = self._vector_sql("$1")
             
-            async with self.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT 
-                        d.file_path,
-                        d.title,
-                        dc.content,
-                        dc.metadata,
-                        1 - (dc.embedding <=> $1::vector) as similarity
-                    FROM document_chunks dc
-                    JOIN documents d ON dc.document_id = d.id
-                    ORDER BY dc.embedding <=> $1::vector
-                    LIMIT $2
-                """, embedding_str, limit)
-                
-                return [dict(row) for row in rows]
-                
+            rows = await self._fetch("semantic", f"""
+                SELECT 
+                    dc.id as chunk_id,
+                    d.file_path,
+                    d.title,
+                    dc.content,
+                    dc.metadata,
+                    {similarity} as similarity
+                FROM document_chunks dc
+                JOIN documents d ON dc.document_id = d.id
+                ORDER BY {distance}
+                LIMIT $2
+            """, embedding_str, limit)
+            
+            return [dict(row) for row in rows]
+            
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in semantic search: {e}")
             raise HTTPException(status_code=500, detail="Search failed")
     
-    async def fulltext_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    async def _diverse_semantic_search(self, query_embedding: List[float], limit: int,
+                                       collapse: Optional[Collapse], mmr: bool,
+                                       mmr_lambda: float) -> List[Dict[str, Any]]:
+        """Over-fetch candidate ids (and vectors, for MMR), pick diverse results, fetch only those"""
+        embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
+        distance, _ = self._vector_sql("$1")
+        candidates = limit * self.diversity_candidates
+        # Best chunk per document among the nearest candidates
+        keep = "WHERE rank_in_document = 1" if collapse == "document" else ""
+        vectors = ", embedding::real[] AS embedding" if mmr else ""
+        
+        candidate_rows = await self._fetch("semantic", f"""
+            SELECT id, document_id, distance{vectors}
+            FROM (
+                SELECT 
+                    dc.id,
+                    dc.document_id,
+                    dc.embedding,
+                    {distance} as distance,
+                    row_number() OVER (PARTITION BY dc.document_id ORDER BY {distance}) as rank_in_document
+                FROM (
+                    SELECT id, document_id, embedding
+                    FROM document_chunks dc
+                    ORDER BY {distance}
+                    LIMIT $2
+                ) dc
+            ) ranked
+            {keep}
+            ORDER BY distance
+        """, embedding_str, candidates)
+        
+        # The connection goes back to the pool while MMR runs
+        if mmr and candidate_rows:
+            picked = mmr_select(
+                query_embedding,
+                [row['embedding'] for row in candidate_rows],
+                limit,
+                mmr_lambda
+            )
+            candidate_rows = [candidate_rows[i] for i in picked]
+        else:
+            candidate_rows = candidate_rows[:limit]
+        
+        rows = await self._fetch("semantic", f"""
+            SELECT 
+                dc.id as chunk_id,
+                d.file_path,
+                d.title,
+                dc.content,
+                dc.metadata,
+                picked.distance
+            FROM unnest($1::integer[], $2::integer[], $3::float8[]) AS picked(id, document_id, distance)
+            JOIN document_chunks dc ON dc.id = picked.id AND dc.document_id = picked.document_id
+            JOIN documents d ON dc.document_id = d.id
+        """, [row['id'] for row in candidate_rows], [row['document_id'] for row in candidate_rows],
+            [row['distance'] for row in candidate_rows])
+        
+        # Keep the MMR (or distance) order of the picked candidates
+        by_id = {row['chunk_id']: dict(row) for row in rows}
+        results = []
+        for row in candidate_rows:
+            result = by_id.get(row['id'])
+            if result:
+                distance_value = result.pop('distance')
+                result['similarity'] = -distance_value if self.vector_metric == "ip" else 1 - distance_value
+                results.append(result)
+        return results
+    
+    async def _local_semantic_search(self, query_embedding: List[float], limit: int) -> List[Dict[str, Any]]:
+        """Top-k from the local vector index, then fetch just those rows"""
+        loop = asyncio.get_running_loop()
+        # Chunks deleted since the last reload are tombstoned as they turn
+        # up and the search repeated, a few times at most
+        for _ in range(3):
+            # NumPy releases the GIL in the matrix product
+            with tracing.span("local_index"):
+                hits = await loop.run_in_executor(None, self.local_index.search, query_embedding, limit)
+            rows = await self._fetch("semantic", """
+                SELECT 
+                    dc.id as chunk_id,
+                    d.file_path,
+                    d.title,
+                    dc.content,
+                    dc.metadata
+                FROM document_chunks dc
+                JOIN documents d ON dc.document_id = d.id
+                WHERE dc.id = ANY($1::integer[])
+            """, [chunk_id for chunk_id, _ in hits])
+            found = {row['chunk_id']: row for row in rows}
+            missing = [chunk_id for chunk_id, _ in hits if chunk_id not in found]
+            if not missing:
+                break
+            self.local_index.remove(missing)
+        
+        return [
+            {**dict(found[chunk_id]), 'similarity': similarity}
+            for chunk_id, similarity in hits if chunk_id in found
+        ]
+    
+    async def _search_partition(self, partition: str, embedding_str: str, limit: int) -> List[asyncpg.Record]:
+        """Top-k of one partition, using its own ANN index"""
+        distance, similarity = self._vector_sql("$1")
+        return await self._fetch("semantic", f"""
+            SELECT 
+                dc.id as chunk_id,
+                d.file_path,
+                d.title,
+                dc.content,
+                dc.metadata,
+                {similarity} as similarity,
+                {distance} as distance
+            FROM {partition} dc
+            JOIN documents d ON dc.document_id = d.id
+            ORDER BY {distance}
+            LIMIT $2
+        """, embedding_str, limit)
+    
+    async def _partitioned_semantic_search(self, embedding_str: str, limit: int) -> List[Dict[str, Any]]:
+        """Fan out across partitions and merge; the global top-k is within the per-partition top-ks"""
+        semaphore = asyncio.Semaphore(self.partition_concurrency)
+
+        async def search_partition(partition: str) -> List[asyncpg.Record]:
+            async with semaphore:
+                return await self._search_partition(partition, embedding_str, limit)
+
+        partition_rows = await asyncio.gather(*(
+            search_partition(partition) for partition in self.chunk_partitions
+        ))
+        merged = heapq.merge(*partition_rows, key=lambda row: row['distance'])
+        return [
+            {key: value for key, value in row.items() if key != 'distance'}
+            for row in itertools.islice(merged, limit)
+        ]
+    
+    @staticmethod
+    def _tsquery(query: str, syntax: str, param: str) -> Tuple[str, str]:
+        """(tsquery SQL for a query parameter, the parameter value) in the given syntax"""
+        if syntax == "prefix":
+            query = prefix_tsquery(query)
+        return f"{TSQUERY_FUNCTIONS[syntax]}('english', {param})", query
+    
+    @coalesced("fulltext")
+    async def fulltext_search(self, query: str, limit: int = 10, syntax: TsquerySyntax = "plain",
+                              collapse: Optional[Collapse] = None) -> List[Dict[str, Any]]:
         """Perform full-text search using PostgreSQL text search"""
+        tsquery, query = self._tsquery(query, syntax, "$1")
+        # Collapsed: only the best-ranked chunk of each document competes
+        distinct = "DISTINCT ON (dc.document_id)" if collapse == "document" else ""
+        order = "dc.document_id, relevance DESC" if collapse == "document" else "relevance DESC"
         try:
-            async with self.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    SELECT 
+            # ts_rank_cd weighs title (A) and header (B) matches above body
+            # (C) ones and rewards query terms that occur close together;
+            # normalization 32 maps the rank into [0, 1)
+            rows = await self._fetch("fulltext", f"""
+                SELECT * FROM (
+                    SELECT {distinct}
+                        dc.id as chunk_id,
                         d.file_path,
                         d.title,
                         dc.content,
                         dc.metadata,
-                        ts_rank(dc.content_tsvector, plainto_tsquery('english', $1)) as relevance
+                        ts_rank_cd(dc.content_tsvector, {tsquery}, 32) as relevance
                     FROM document_chunks dc
                     JOIN documents d ON dc.document_id = d.id
-                    WHERE dc.content_tsvector @@ plainto_tsquery('english', $1)
-                    ORDER BY relevance DESC
-                    LIMIT $2
-                """, query, limit)
-                
-                return [dict(row) for row in rows]
-                
+                    WHERE dc.content_tsvector @@ {tsquery}
+                    ORDER BY {order}
+                ) matches
+                ORDER BY relevance DESC
+                LIMIT $2
+            """, query, limit)
+            
+            return [dict(row) for row in rows]
+            
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in fulltext search: {e}")
             raise HTTPException(status_code=500, detail="Search failed")
     
-    async def hybrid_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+    @coalesced("fuzzy")
+    async def fuzzy_search(self, query: str, limit: int = 10) -> List[Dict[str, Any]]:
+        """Typo-tolerant lookup of file paths, titles and section headers via trigram indexes"""
+        try:
+            # Best match per document; header matches return their chunk,
+            # path and title matches the start of the document
+            rows = await self._fetch("fuzzy", """
+                WITH matches AS (
+                    SELECT id AS document_id, NULL::integer AS chunk_id, 'file_path' AS matched,
+                           word_similarity($1, file_path) AS score
+                    FROM documents
+                    WHERE $1 <% file_path
+                    UNION ALL
+                    SELECT id, NULL, 'title', word_similarity($1, title)
+                    FROM documents
+                    WHERE $1 <% title
+                    UNION ALL
+                    SELECT document_id, id, 'header', word_similarity($1, metadata->>'header')
+                    FROM document_chunks
+                    WHERE $1 <% (metadata->>'header')
+                ),
+                best AS (
+                    SELECT DISTINCT ON (document_id) *
+                    FROM matches
+                    ORDER BY document_id, score DESC
+                )
+                SELECT 
+                    d.file_path,
+                    COALESCE(d.title, '') as title,
+                    COALESCE(dc.content, left(d.content, 500)) as content,
+                    jsonb_build_object('matched', best.matched) || COALESCE(dc.metadata, '{}'::jsonb) as metadata,
+                    best.score as similarity
+                FROM best
+                JOIN documents d ON d.id = best.document_id
+                LEFT JOIN document_chunks dc ON dc.id = best.chunk_id AND dc.document_id = best.document_id
+                ORDER BY best.score DESC
+                LIMIT $2
+            """, query, limit)
+            
+            return [dict(row) for row in rows]
+            
+        except HTTPException:
+            raise
+        except Exception as e:
+            logger.error(f"Error in fuzzy search: {e}")
+            raise HTTPException(status_code=500, detail="Search failed")
+    
+    @coalesced("hybrid")
+    async def hybrid_search(self, query: str, limit: int = 10, syntax: TsquerySyntax = "plain",
+                            collapse: Optional[Collapse] = None, rerank: bool = False) -> List[Dict[str, Any]]:
         """Perform hybrid search combining semantic and full-text search"""
+        tsquery, text_query = self._tsquery(query, syntax, "$3")
+        # Reranked: fuse a deeper list and let the cross-encoder pick the top limit
+        fused = max(limit, self.rerank_candidates) if rerank else limit
+        # Collapsed: over-fetch candidates, then keep the best chunk per document
+        candidates = fused * self.diversity_candidates if collapse == "document" else fused
+        distinct = "DISTINCT ON (COALESCE(s.document_id, f.document_id))" if collapse == "document" else "DISTINCT"
+        order = ("COALESCE(s.document_id, f.document_id), combined_score DESC" if collapse == "document"
+                 else "combined_score DESC")
         try:
             # Generate query embedding
             query_embedding = await self.generate_embedding(query)
             embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'        
+            distance, similarity = self._vector_sql("$1")
             
-            async with self.pool.acquire() as conn:
-                rows = await conn.fetch("""
-                    WITH semantic_results AS (
-                        SELECT 
-                            dc.id,
-                            d.file_path,
-                            d.title,
-                            dc.content,
-                            dc.metadata,
-                            (1 - (dc.embedding <=> $1::vector)) * 0.7 as semantic_score
-                        FROM document_chunks dc
-                        JOIN documents d ON dc.document_id = d.id
-                        ORDER BY dc.embedding <=> $1::vector
-                        LIMIT $2
-                    ),
-                    fulltext_results AS (
-                        SELECT 
-                            dc.id,
-                            d.file_path,
-                            d.title,
-                            dc.content,
-                            dc.metadata,
-                            ts_rank(dc.content_tsvector, plainto_tsquery('english', $3)) * 0.3 as fulltext_score
-                        FROM document_chunks dc
-                        JOIN documents d ON dc.document_id = d.id
-                        WHERE dc.content_tsvector @@ plainto_tsquery('english', $3)
-                        ORDER BY fulltext_score DESC
-                        LIMIT $2
-                    )
-                    SELECT DISTINCT
-                        COALESCE(s.file_path, f.file_path) as file_path,
-                        COALESCE(s.title, f.title) as title,
-                        COALESCE(s.content, f.content) as content,
-                        COALESCE(s.metadata, f.metadata) as metadata,
-                        COALESCE(s.semantic_score, 0) + COALESCE(f.fulltext_score, 0) as combined_score
-                    FROM semantic_results s
-                    FULL OUTER JOIN fulltext_results f ON s.id = f.id
+            # Fuse on ids and scores alone; content is loaded only for the
+            # fused rows (the reranker's candidates, or the results)
+            rows = await self._fetch("hybrid", f"""
+                WITH semantic_results AS (
+                    SELECT 
+                        dc.id,
+                        dc.document_id,
+                        ({similarity}) * 0.7 as semantic_score
+                    FROM document_chunks dc
+                    JOIN documents d ON dc.document_id = d.id
+                    ORDER BY {distance}
+                    LIMIT $4
+                ),
+                fulltext_results AS (
+                    SELECT 
+                        dc.id,
+                        dc.document_id,
+                        ts_rank_cd(dc.content_tsvector, {tsquery}, 32) * 0.3 as fulltext_score
+                    FROM document_chunks dc
+                    JOIN documents d ON dc.document_id = d.id
+                    WHERE dc.content_tsvector @@ {tsquery}
+                    ORDER BY fulltext_score DESC
+                    LIMIT $4
+                ),
+                fused AS (
+                    SELECT * FROM (
+                        SELECT {distinct}
+                            COALESCE(s.id, f.id) as chunk_id,
+                            COALESCE(s.document_id, f.document_id) as document_id,
+                            COALESCE(s.semantic_score, 0) + COALESCE(f.fulltext_score, 0) as combined_score
+                        FROM semantic_results s
+                        FULL OUTER JOIN fulltext_results f ON s.id = f.id
+                        ORDER BY {order}
+                    ) combined
                     ORDER BY combined_score DESC
                     LIMIT $2
-                """, embedding_str, limit, query)
-                
-                return [dict(row) for row in rows]
-                
+                )
+                SELECT 
+                    fused.chunk_id,
+                    d.file_path,
+                    d.title,
+                    dc.content,
+                    dc.metadata,
+                    fused.combined_score
+                FROM fused
+                JOIN document_chunks dc ON dc.id = fused.chunk_id AND dc.document_id = fused.document_id
+                JOIN documents d ON d.id = fused.document_id
+                ORDER BY fused.combined_score DESC
+            """, embedding_str, fused, text_query, candidates)
+            
+        except HTTPException:
+            raise
         except Exception as e:
             logger.error(f"Error in hybrid search: {e}")
             raise HTTPException(status_code=500, detail="Search failed")
+        
+        results = [dict(row) for row in rows]
+        if rerank:
+            results = await self.rerank(query, results, limit)
+        return results
 
 
 # Global search API instance
@@ -270,6 +810,28 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.middleware("http")(metrics.record_request)
+
+def start_timings(api: SearchAPI, debug: bool) -> Optional[tracing.RequestTimings]:
+    """Collect this request's phase timings if it asked for them or Server-Timing is always on"""
+    return tracing.start() if debug or api.server_timing else None
+
+
+def search_response(query: str, results: List[Dict[str, Any]], response: Response,
+                    timings: Optional[tracing.RequestTimings], debug: bool) -> SearchResponse:
+    """SearchResponse for result rows, reporting timings in Server-Timing (and debug)"""
+    with tracing.span("model"):
+        search_results = [SearchResult(**result) for result in results]
+    if timings:
+        timings.finish()
+        response.headers["Server-Timing"] = timings.server_timing()
+    return SearchResponse(
+        results=search_results,
+        count=len(results),
+        query=query,
+        debug={"timings_ms": timings.milliseconds()} if timings and debug else None
+    )
+
 
 def get_search_api() -> SearchAPI:
     """Dependency to get search API instance"""
@@ -284,65 +846,91 @@ async def health_check():
 
 @app.get("/search/semantic", response_model=SearchResponse)
 async def semantic_search_endpoint(
+    response: Response,
     query: str = Query(..., description="Search query"),
     limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    collapse: Optional[Collapse] = Query(None, description="'document': at most one chunk per document"),
+    mmr: bool = Query(False, description="Diversify results with maximal marginal relevance"),
+    mmr_lambda: float = Query(0.7, ge=0.0, le=1.0, description="MMR trade-off: 1 = relevance only, 0 = diversity only"),
+    debug: bool = Query(False, description="Report a per-phase timing breakdown"),
     api: SearchAPI = Depends(get_search_api)
 ):
     """Semantic search using vector similarity"""
-    results = await api.semantic_search(query, limit)
+    timings = start_timings(api, debug)
+    results = await api.semantic_search(query, limit, collapse, mmr, mmr_lambda)
     
-    return SearchResponse(
-        results=[SearchResult(**result) for result in results],
-        count=len(results),
-        query=query
-    )
+    return search_response(query, results, response, timings, debug)
 
 
 @app.get("/search/fulltext", response_model=SearchResponse)
 async def fulltext_search_endpoint(
+    response: Response,
     query: str = Query(..., description="Search query"),
     limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    syntax: TsquerySyntax = Query("plain", description="Query syntax: plain, websearch or prefix"),
+    collapse: Optional[Collapse] = Query(None, description="'document': at most one chunk per document"),
+    debug: bool = Query(False, description="Report a per-phase timing breakdown"),
     api: SearchAPI = Depends(get_search_api)
 ):
     """Full-text search using PostgreSQL text search"""
-    results = await api.fulltext_search(query, limit)
+    timings = start_timings(api, debug)
+    results = await api.fulltext_search(query, limit, syntax, collapse)
     
     # Convert relevance to similarity for consistent response format
     for result in results:
         result['similarity'] = result.pop('relevance', 0.0)
     
-    return SearchResponse(
-        results=[SearchResult(**result) for result in results],
-        count=len(results),
-        query=query
-    )
+    return search_response(query, results, response, timings, debug)
+
+
+@app.get("/search/fuzzy", response_model=SearchResponse)
+async def fuzzy_search_endpoint(
+    response: Response,
+    query: str = Query(..., description="File name, title or header, typos allowed"),
+    limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    debug: bool = Query(False, description="Report a per-phase timing breakdown"),
+    api: SearchAPI = Depends(get_search_api)
+):
+    """Fuzzy lookup of file paths, titles and headers using trigram similarity"""
+    timings = start_timings(api, debug)
+    results = await api.fuzzy_search(query, limit)
+    
+    return search_response(query, results, response, timings, debug)
 
 
 @app.get("/search/hybrid", response_model=SearchResponse)
 async def hybrid_search_endpoint(
+    response: Response,
     query: str = Query(..., description="Search query"),
     limit: int = Query(10, ge=1, le=50, description="Maximum number of results"),
+    syntax: TsquerySyntax = Query("plain", description="Query syntax: plain, websearch or prefix"),
+    collapse: Optional[Collapse] = Query(None, description="'document': at most one chunk per document"),
+    rerank: bool = Query(False, description="Reorder the fused candidates with a cross-encoder"),
+    debug: bool = Query(False, description="Report a per-phase timing breakdown"),
     api: SearchAPI = Depends(get_search_api)
 ):
     """Hybrid search combining semantic and full-text search"""
-    results = await api.hybrid_search(query, limit)
+    timings = start_timings(api, debug)
+    results = await api.hybrid_search(query, limit, syntax, collapse, rerank)
     
     # Convert combined_score to similarity for consistent response format
     for result in results:
         result['similarity'] = result.pop('combined_score', 0.0)
     
-    return SearchResponse(
-        results=[SearchResult(**result) for result in results],
-        count=len(results),
-        query=query
-    )
+    return search_response(query, results, response, timings, debug)
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    """Prometheus metrics"""
+    return metrics.metrics_response()
 
 
 @app.get("/stats")
 async def get_stats(api: SearchAPI = Depends(get_search_api)):
     """Get database statistics"""
     try:
-        async with api.pool.acquire() as conn:
+        async with api.acquire() as conn:
             # Get document count
             doc_count = await conn.fetchval("SELECT COUNT(*) FROM documents")
             
@@ -352,11 +940,20 @@ async def get_stats(api: SearchAPI = Depends(get_search_api)):
             # Get latest update
             last_update = await conn.fetchval("SELECT MAX(updated_at) FROM documents")
             
-            return {
+            stats = {
                 "documents": doc_count,
                 "chunks": chunk_count,
                 "last_update": last_update.isoformat() if last_update else None
             }
+            stats["pool"] = api.pool_stats()
+            stats["queries"] = api.query_stats()
+            if api.single_flight:
+                stats["single_flight"] = api.single_flight.stats()
+            if api.local_index:
+                stats["local_vector_index"] = api.local_index.stats()
+            return stats
+    except HTTPException:
+        raise
     except Exception as e:
         logger.error(f"Error getting stats: {e}")
         raise HTTPException(status_code=500, detail="Failed to get statistics")
@@ -0,0 +1,84 @@
+"""
+Per-request latency breakdown for the search API.
+
+A request that asks for timings gets a RequestTimings bound to a context
+variable; code along the search path adds its phases to it with span(),
+which costs a context variable lookup when nobody is listening. Phases that
+run several times (or concurrently, like per-partition queries) add up, so
+they can sum past the request's wall time.
+"""
+
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, Optional
+
+_current: ContextVar[Optional["RequestTimings"]] = ContextVar("request_timings", default=None)
+
+# Server-Timing metric names and descriptions, in reporting order
+PHASES = {
+    "embed": "Query embedding (embedding service)",
+    "local_index": "Local vector index search",
+    "coalesced": "Waiting for an identical in-flight search",
+    "pool": "Waiting for a database connection",
+    "sql": "SQL execution",
+    "rerank": "Cross-encoder rerank",
+    "model": "Response model construction",
+    "metadata": "Metadata JSON parsing",
+    "total": "Whole request",
+}
+
+
+class RequestTimings:
+    """Seconds spent per phase of one request"""
+
+    def __init__(self):
+        self.started = time.perf_counter()
+        self.phases: Dict[str, float] = {}
+
+    def add(self, phase: str, seconds: float):
+        self.phases[phase] = self.phases.get(phase, 0.0) + seconds
+
+    def finish(self):
+        self.phases["total"] = time.perf_counter() - self.started
+
+    def milliseconds(self) -> Dict[str, float]:
+        return {phase: round(seconds * 1000, 3) for phase, seconds in self.phases.items()}
+
+    def server_timing(self) -> str:
+        """Server-Timing header value, e.g. 'embed;dur=12.1;desc="..."', phases in PHASES order"""
+        ordered = sorted(self.phases, key=lambda phase: list(PHASES).index(phase) if phase in PHASES else len(PHASES))
+        return ", ".join(
+            f'{phase};dur={self.phases[phase] * 1000:.3f};desc="{PHASES.get(phase, phase)}"' for phase in ordered
+        )
+
+
+def start() -> RequestTimings:
+    """Collect timings for the current request (and tasks it starts from here on)"""
+    timings = RequestTimings()
+    _current.set(timings)
+    return timings
+
+
+def current() -> Optional[RequestTimings]:
+    return _current.get()
+
+
+def add(phase: str, seconds: float):
+    timings = _current.get()
+    if timings is not None:
+        timings.add(phase, seconds)
+
+
+@contextmanager
+def span(phase: str):
+    """Time the block into the current request's phase, if it is collecting timings"""
+    timings = _current.get()
+    if timings is None:
+        yield
+        return
+    start_time = time.perf_counter()
+    try:
+        yield
+    finally:
+        timings.add(phase, time.perf_counter() - start_time)
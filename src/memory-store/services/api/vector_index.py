@@ -0,0 +1,298 @@
+"""
+In-process replica of the document_chunks embeddings for the search API.
+
+Holds every chunk embedding as a row of a contiguous float32 matrix,
+normalized to unit length, so a semantic query is one matrix-vector
+product and a partial sort in NumPy instead of an ANN scan in Postgres.
+New chunks are pulled incrementally by id (ids come from a sequence, so
+they only grow); chunks deleted in Postgres are noticed when their rows
+are fetched and tombstoned, and dropped for good on the periodic full
+reload.
+
+Alternatively the index memory-maps a snapshot file published by the
+processor (services/processor/snapshot.py) after each ingest run. All
+workers on a node then share one copy of the vectors through the page
+cache, start without loading anything from Postgres, and switch to a new
+snapshot when the processor renames one into place.
+"""
+
+import asyncio
+import logging
+import os
+import struct
+import time
+from typing import Any, Dict, List, NamedTuple, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Rows fetched per query while loading or refreshing
+LOAD_PAGE_SIZE = 10000
+
+# Snapshot file format, as written by services/processor/snapshot.py
+SNAPSHOT_MAGIC = b"MSEMBSNP"
+SNAPSHOT_VERSION = 1
+SNAPSHOT_HEADER = struct.Struct("<8sIIQQQ")
+SNAPSHOT_HEADER_SIZE = 64
+SNAPSHOT_DTYPES = {1: np.float32, 2: np.float16}
+
+# Rows converted to float32 at a time when scoring float16 snapshots
+SCORE_BLOCK_ROWS = 16384
+
+
+class IndexState(NamedTuple):
+    """
+    One consistent version of the index, published by a single assignment.
+
+    Rows [0, size) are live; the arrays may have spare capacity past size
+    that a later append fills in before publishing a larger state, which
+    searches holding this state never read.
+    """
+    ids: np.ndarray
+    vectors: np.ndarray
+    alive: np.ndarray
+    size: int
+    tombstones: int
+
+
+EMPTY_STATE = IndexState(np.empty(0, dtype=np.int64), np.empty((0, 0), dtype=np.float32),
+                         np.empty(0, dtype=bool), 0, 0)
+
+
+class LocalVectorIndex:
+    """Brute-force cosine top-k over an in-memory copy of the chunk embeddings"""
+
+    def __init__(self, refresh_interval: float = 10.0, reload_interval: float = 3600.0,
+                 snapshot_path: str = ""):
+        self.refresh_interval = refresh_interval
+        # Full reloads compact away tombstones; 0 disables them
+        self.reload_interval = reload_interval
+        self.snapshot_path = snapshot_path
+        self._snapshot_version = None
+        # Searches run in executor threads and read this once, so a reload
+        # or append swapping it never mixes arrays from two versions
+        self._state = EMPTY_STATE
+        self.max_id = 0
+        self.loaded_at = 0.0
+        self.refreshed_at = 0.0
+
+    @property
+    def ready(self) -> bool:
+        return self.loaded_at > 0
+
+    @property
+    def tombstones(self) -> int:
+        return self._state.tombstones
+
+    def __len__(self) -> int:
+        state = self._state
+        return state.size - state.tombstones
+
+    async def load(self, pool):
+        """Replace the index with every embedding currently in document_chunks"""
+        if self.snapshot_path:
+            self.load_snapshot()
+            return
+        start = time.perf_counter()
+        ids, vectors = await self._fetch_since(pool, 0)
+        self._state = IndexState(ids, vectors, np.ones(len(ids), dtype=bool), len(ids), 0)
+        self.max_id = int(ids[-1]) if len(ids) else 0
+        self.loaded_at = self.refreshed_at = time.time()
+        logger.info("Local vector index: loaded %d vectors (%.1f MB) in %.2fs",
+                    len(ids), vectors.nbytes / 2**20, time.perf_counter() - start)
+
+    async def refresh(self, pool) -> int:
+        """Append chunks inserted since the last load or refresh; returns how many"""
+        ids, vectors = await self._fetch_since(pool, self.max_id)
+        if len(ids):
+            self._append(ids, vectors)
+            self.max_id = int(ids[-1])
+        self.refreshed_at = time.time()
+        return len(ids)
+
+    def load_snapshot(self) -> bool:
+        """Map the snapshot file if it changed since the last load; returns whether it did"""
+        try:
+            stat = os.stat(self.snapshot_path)
+        except FileNotFoundError:
+            if not self.ready:
+                logger.warning("Local vector index: no snapshot at %s yet", self.snapshot_path)
+            return False
+        version = (stat.st_ino, stat.st_mtime_ns, stat.st_size)
+        if version == self._snapshot_version:
+            return False
+
+        with open(self.snapshot_path, "rb") as f:
+            magic, format_version, dtype_code, count, dims, max_id = SNAPSHOT_HEADER.unpack(
+                f.read(SNAPSHOT_HEADER.size))
+        if magic != SNAPSHOT_MAGIC or format_version != SNAPSHOT_VERSION or dtype_code not in SNAPSHOT_DTYPES:
+            raise ValueError(f"{self.snapshot_path} is not a version {SNAPSHOT_VERSION} embedding snapshot")
+
+        ids_offset = SNAPSHOT_HEADER_SIZE
+        vectors_offset = (ids_offset + count * 8 + 63) // 64 * 64
+        if count:
+            ids = np.memmap(self.snapshot_path, dtype=np.int64, mode="r", offset=ids_offset, shape=(count,))
+            vectors = np.memmap(self.snapshot_path, dtype=SNAPSHOT_DTYPES[dtype_code], mode="r",
+                                offset=vectors_offset, shape=(count, dims))
+        else:
+            ids = np.empty(0, dtype=np.int64)
+            vectors = np.empty((0, 0), dtype=np.float32)
+
+        # Searches in flight keep the old mapping (and file) alive until they finish
+        self._state = IndexState(ids, vectors, np.ones(count, dtype=bool), count, 0)
+        self.max_id = max_id
+        self.loaded_at = self.refreshed_at = time.time()
+        self._snapshot_version = version
+        logger.info("Local vector index: mapped snapshot %s (%d x %d %s)",
+                    self.snapshot_path, count, dims, np.dtype(SNAPSHOT_DTYPES[dtype_code]).name)
+        return True
+
+    async def run_refresh(self, pool):
+        """Background task: pull deltas (or pick up new snapshots), and reload periodically"""
+        while True:
+            await asyncio.sleep(self.refresh_interval)
+            try:
+                if self.snapshot_path:
+                    self.load_snapshot()
+                elif self.reload_interval and time.time() - self.loaded_at > self.reload_interval:
+                    await self.load(pool)
+                else:
+                    added = await self.refresh(pool)
+                    if added:
+                        logger.info("Local vector index: added %d vectors", added)
+            except Exception as e:
+                # Keep serving the current copy; the next round retries
+                logger.error(f"Local vector index refresh failed: {e}")
+
+    async def _fetch_since(self, pool, after_id: int) -> Tuple[np.ndarray, np.ndarray]:
+        """(ids, unit-normalized float32 vectors) of chunks with id > after_id, in id order"""
+        id_pages, vector_pages = [], []
+        async with pool.acquire() as conn:
+            while True:
+                rows = await conn.fetch("""
+                    SELECT id, embedding::real[] AS embedding
+                    FROM document_chunks
+                    WHERE id > $1 AND embedding IS NOT NULL
+                    ORDER BY id
+                    LIMIT $2
+                """, after_id, LOAD_PAGE_SIZE)
+                if not rows:
+                    break
+                id_pages.append(np.fromiter((row['id'] for row in rows), dtype=np.int64, count=len(rows)))
+                vector_pages.append(np.array([row['embedding'] for row in rows], dtype=np.float32))
+                after_id = rows[-1]['id']
+                if len(rows) < LOAD_PAGE_SIZE:
+                    break
+
+        if not id_pages:
+            dims = self._state.vectors.shape[1] if self._state.vectors.size else 0
+            return np.empty(0, dtype=np.int64), np.empty((0, dims), dtype=np.float32)
+
+        vectors = np.concatenate(vector_pages)
+        vectors /= np.clip(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12, None)
+        return np.concatenate(id_pages), vectors
+
+    def _append(self, ids: np.ndarray, vectors: np.ndarray):
+        state = self._state
+        size, end = state.size, state.size + len(ids)
+        if state.vectors.size == 0 or end > len(state.ids):
+            # Grow geometrically into new arrays; searches in flight keep
+            # the old state
+            capacity = max(end, int(len(state.ids) * 1.5), 1024)
+            new_ids = np.empty(capacity, dtype=np.int64)
+            new_vectors = np.empty((capacity, vectors.shape[1]), dtype=np.float32)
+            new_alive = np.zeros(capacity, dtype=bool)
+            new_ids[:size] = state.ids[:size]
+            new_vectors[:size] = state.vectors[:size]
+            new_alive[:size] = state.alive[:size]
+        else:
+            # Only rows past every published state's size are written
+            new_ids, new_vectors, new_alive = state.ids, state.vectors, state.alive
+        new_ids[size:end] = ids
+        new_vectors[size:end] = vectors
+        new_alive[size:end] = True
+        self._state = IndexState(new_ids, new_vectors, new_alive, end, state.tombstones)
+
+    def remove(self, ids: List[int]):
+        """Tombstone chunks that no longer exist in Postgres"""
+        state = self._state
+        positions = np.searchsorted(state.ids[:state.size], ids)
+        alive = None
+        tombstones = state.tombstones
+        for position, chunk_id in zip(positions, ids):
+            if position < state.size and state.ids[position] == chunk_id and state.alive[position]:
+                if alive is None:
+                    # Copy on write: searches holding the published state keep its mask
+                    alive = state.alive.copy()
+                alive[position] = False
+                tombstones += 1
+        if alive is not None:
+            self._state = state._replace(alive=alive, tombstones=tombstones)
+
+    def search(self, query: List[float], k: int) -> List[Tuple[int, float]]:
+        """Top-k (chunk id, cosine similarity) for a query embedding, best first"""
+        state = self._state
+        size = state.size
+        if size == 0 or k <= 0:
+            return []
+        ids, vectors, alive = state.ids[:size], state.vectors[:size], state.alive[:size]
+
+        query_vector = np.asarray(query, dtype=np.float32)
+        query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+        if vectors.dtype == np.float32:
+            scores = vectors @ query_vector
+        else:
+            # NumPy has no fast float16 matrix product; score in float32 blocks
+            scores = np.empty(size, dtype=np.float32)
+            for start in range(0, size, SCORE_BLOCK_ROWS):
+                block = vectors[start:start + SCORE_BLOCK_ROWS].astype(np.float32)
+                scores[start:start + len(block)] = block @ query_vector
+        if state.tombstones:
+            scores[~alive] = -np.inf
+        k = min(k, size)
+        top = np.argpartition(-scores, k - 1)[:k]
+        top = top[np.argsort(-scores[top])]
+        return [(int(ids[i]), float(scores[i])) for i in top if scores[i] != -np.inf]
+
+    def stats(self) -> Dict[str, Any]:
+        state = self._state
+        return {
+            "vectors": state.size - state.tombstones,
+            "tombstones": state.tombstones,
+            "dimensions": state.vectors.shape[1] if state.vectors.size else None,
+            "memory_mb": round(state.vectors.nbytes / 2**20, 1),
+            "dtype": state.vectors.dtype.name,
+            "snapshot": self.snapshot_path or None,
+            "max_id": self.max_id,
+            "loaded_at": self.loaded_at or None,
+            "refreshed_at": self.refreshed_at or None,
+        }
+
+
+def mmr_select(query: List[float], vectors: List[List[float]], k: int, mmr_lambda: float) -> List[int]:
+    """
+    Indexes of k vectors picked by maximal marginal relevance, in pick order.
+
+    Each pick maximizes mmr_lambda * similarity to the query minus
+    (1 - mmr_lambda) * the highest similarity to an already picked vector,
+    so near-duplicate chunks (e.g. overlapping neighbours) give way to
+    results that add something new.
+    """
+    matrix = np.asarray(vectors, dtype=np.float32)
+    matrix /= np.clip(np.linalg.norm(matrix, axis=1, keepdims=True), 1e-12, None)
+    query_vector = np.asarray(query, dtype=np.float32)
+    query_vector /= max(float(np.linalg.norm(query_vector)), 1e-12)
+
+    relevance = matrix @ query_vector
+    redundancy = np.zeros(len(matrix), dtype=np.float32)
+    available = np.ones(len(matrix), dtype=bool)
+    picked = []
+    for _ in range(min(k, len(matrix))):
+        scores = np.where(available, mmr_lambda * relevance - (1 - mmr_lambda) * redundancy, -np.inf)
+        best = int(np.argmax(scores))
+        picked.append(best)
+        available[best] = False
+        redundancy = np.maximum(redundancy, matrix @ matrix[best])
+    return picked
@@ -0,0 +1,90 @@
+#!/usr/bin/env python3
+"""
+In-process encode benchmark for the embedding server.
+
+Encodes a mixed batch of short queries and long chunks with a single
+model.encode() call (fixed batch size) and with encode_by_length()
+(length-bucketed, token-budgeted batches), and reports texts/sec. With
+--onnx-dir, also runs the ONNX Runtime backend (exporting it there first
+if needed) and reports its parity with the torch model.
+
+    python bench_encode.py --texts 100 --repeat 5
+    python bench_encode.py --onnx-dir /tmp/onnx/all-MiniLM-L6-v2 --quantize
+"""
+
+import argparse
+import os
+import random
+import time
+
+import numpy as np
+from sentence_transformers import SentenceTransformer
+
+from embedding_server import encode_by_length
+from onnx_backend import OnnxSentenceEncoder, check_parity, export_model, is_exported
+
+WORDS = (
+    "cluster node deploy ansible kubernetes service memory vector index query "
+    "embedding chunk search worker pod helm chart volume config secret network"
+).split()
+
+
+def mixed_texts(count: int, seed: int = 42):
+    """Short queries interleaved with chunk-sized texts, like ingestion plus search traffic"""
+    rng = random.Random(seed)
+    texts = []
+    for i in range(count):
+        words = rng.randint(3, 10) if i % 3 == 0 else rng.randint(120, 220)
+        texts.append(" ".join(rng.choices(WORDS, k=words)))
+    return texts
+
+
+def best_of(repeat: int, fn):
+    best = float('inf')
+    result = None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        result = fn()
+        best = min(best, time.perf_counter() - start)
+    return best, result
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Embedding encode benchmark')
+    parser.add_argument('--model', default=os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2"))
+    parser.add_argument('--texts', type=int, default=100)
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--onnx-dir', help='Also benchmark the ONNX backend exported to this directory')
+    parser.add_argument('--quantize', action='store_true', help='Use the dynamic int8 ONNX model')
+    args = parser.parse_args()
+
+    model = SentenceTransformer(args.model, device="cpu")
+    texts = mixed_texts(args.texts)
+
+    # Warm up allocator and kernels before timing
+    model.encode(texts[:8])
+
+    plain_time, plain = best_of(args.repeat, lambda: model.encode(
+        texts, convert_to_numpy=True, normalize_embeddings=True))
+    bucketed_time, bucketed = best_of(args.repeat, lambda: encode_by_length(model, texts))
+
+    min_cosine = float(np.min(np.sum(plain * bucketed, axis=1)))
+    print(f"{'model.encode':>16}: {plain_time:.3f}s ({len(texts) / plain_time:.1f} texts/s)")
+    print(f"{'encode_by_length':>16}: {bucketed_time:.3f}s ({len(texts) / bucketed_time:.1f} texts/s)")
+    print(f"Speedup: {plain_time / bucketed_time:.2f}x, min cosine vs plain: {min_cosine:.6f}")
+
+    if args.onnx_dir:
+        if not is_exported(args.onnx_dir, args.quantize):
+            export_model(model, args.onnx_dir, quantize=args.quantize)
+        encoder = OnnxSentenceEncoder(args.onnx_dir, quantize=args.quantize)
+        encoder.encode(texts[:8])
+
+        onnx_time, _ = best_of(args.repeat, lambda: encode_by_length(encoder, texts))
+        label = 'onnx-int8' if args.quantize else 'onnx'
+        print(f"{label:>16}: {onnx_time:.3f}s ({len(texts) / onnx_time:.1f} texts/s), "
+              f"{plain_time / onnx_time:.2f}x vs model.encode, "
+              f"min cosine vs torch: {check_parity(model, encoder, texts):.6f}")
+
+
+if __name__ == "__main__":
+    main()
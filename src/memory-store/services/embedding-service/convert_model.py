@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+Convert sentence-transformers models into local startup artifacts.
+
+Saves each model to <models_dir>/<name> with safetensors weights, which
+load memory-mapped without unpickling, along with its tokenizer and
+pooling config. The server loads models found under EMBEDDING_MODEL_DIR
+from there, without resolving them through the Hugging Face hub.
+
+With --onnx-dir (the server's ONNX_CACHE_DIR) it also exports each model
+to ONNX and records the export's parity with the torch model there, so
+EMBEDDING_BACKEND=onnx servers start without loading the torch model.
+
+    python convert_model.py all-MiniLM-L6-v2 /app/models
+    python convert_model.py all-MiniLM-L6-v2 /app/models --onnx-dir /app/onnx --quantize
+"""
+
+import glob
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+
+def local_model_dir(models_dir: str, model_name: str) -> str:
+    """Directory holding the converted artifact for a model"""
+    return os.path.join(models_dir, model_name.replace("/", "__"))
+
+
+def is_converted(model_dir: str) -> bool:
+    """Whether model_dir holds a converted model with safetensors weights"""
+    return (os.path.exists(os.path.join(model_dir, "modules.json")) and
+            os.path.exists(os.path.join(model_dir, "model.safetensors")))
+
+
+def convert_model(model_name: str, models_dir: str, model=None) -> str:
+    """Save a model (loaded by name unless given) as a local safetensors artifact"""
+    from sentence_transformers import SentenceTransformer
+
+    model_dir = local_model_dir(models_dir, model_name)
+    if model is None:
+        model = SentenceTransformer(model_name, device="cpu")
+    model.save(model_dir)
+
+    # Older checkpoints may leave pickled weights next to the safetensors
+    for pickled in glob.glob(os.path.join(model_dir, "pytorch_model*.bin")):
+        os.remove(pickled)
+
+    if not is_converted(model_dir):
+        raise RuntimeError(f"{model_name} was not saved with safetensors weights")
+    return model_dir
+
+
+if __name__ == "__main__":
+    import argparse
+
+    import numpy as np
+    from sentence_transformers import SentenceTransformer
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Convert sentence-transformers models to local artifacts")
+    parser.add_argument("model_names", nargs="+")
+    parser.add_argument("models_dir")
+    parser.add_argument("--onnx-dir", help="Also export to ONNX under this directory (ONNX_CACHE_DIR)")
+    parser.add_argument("--quantize", action="store_true", help="Export dynamic int8 weights too (ONNX_QUANTIZE)")
+    args = parser.parse_args()
+
+    texts = ["How do I deploy services to the compute cluster?", "Hello world"]
+    for model_name in args.model_names:
+        start = time.perf_counter()
+        reference = SentenceTransformer(model_name, device="cpu")
+        hub_load_time = time.perf_counter() - start
+
+        model_dir = convert_model(model_name, args.models_dir, reference)
+
+        start = time.perf_counter()
+        converted = SentenceTransformer(model_dir, device="cpu")
+        local_load_time = time.perf_counter() - start
+
+        min_cosine = float(np.min(np.sum(
+            reference.encode(texts, normalize_embeddings=True) *
+            converted.encode(texts, normalize_embeddings=True), axis=1)))
+        logger.info("%s -> %s: load %.2fs from hub cache, %.2fs converted, min cosine %.6f",
+                    model_name, model_dir, hub_load_time, local_load_time, min_cosine)
+        if min_cosine < 0.9999:
+            raise SystemExit(f"Converted {model_name} does not reproduce the original embeddings")
+
+        if args.onnx_dir:
+            from onnx_backend import export_checked, onnx_model_dir
+
+            onnx_dir = onnx_model_dir(args.onnx_dir, model_name)
+            for quantize in ([False, True] if args.quantize else [False]):
+                min_cosine = export_checked(reference, onnx_dir, quantize=quantize)
+                logger.info("%s -> %s%s: ONNX parity min cosine %.6f",
+                            model_name, onnx_dir, " (int8)" if quantize else "", min_cosine)
@@ -0,0 +1,153 @@
+"""
+Embedding cache for the embedding server.
+
+Embeddings are keyed by (model, SHA-1 of the text) and held in a bounded
+in-memory LRU, optionally backed by a SQLite database on disk that outlives
+restarts and is shared by the worker processes of one server.
+"""
+
+import hashlib
+import logging
+import sqlite3
+from collections import OrderedDict
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# SQLite limits the number of bound parameters per statement
+SQLITE_BATCH_SIZE = 500
+
+
+def text_key(text: str) -> bytes:
+    return hashlib.sha1(text.encode("utf-8")).digest()
+
+
+class EmbeddingCache:
+    """Bounded LRU of embeddings with an optional SQLite tier"""
+
+    def __init__(self, max_entries: int, db_path: Optional[str] = None, db_max_rows: int = 0):
+        self.max_entries = max_entries
+        self.db_path = db_path
+        # 0 leaves the on-disk tier unbounded
+        self.db_max_rows = db_max_rows
+        self._entries: "OrderedDict[tuple, np.ndarray]" = OrderedDict()
+        self._db = None
+        self._db_writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    def open(self):
+        """Open the on-disk tier; call in each process, after any fork"""
+        if not self.db_path or self._db is not None:
+            return
+        self._db = sqlite3.connect(self.db_path, timeout=10, check_same_thread=False)
+        # WAL lets worker processes read while one of them writes
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("PRAGMA synchronous=NORMAL")
+        self._db.execute("""
+            CREATE TABLE IF NOT EXISTS embeddings (
+                model TEXT NOT NULL,
+                text_hash BLOB NOT NULL,
+                embedding BLOB NOT NULL,
+                PRIMARY KEY (model, text_hash)
+            )
+        """)
+        self._db.commit()
+        logger.info("Embedding cache database: %s", self.db_path)
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def get_many(self, model: str, keys: List[bytes]) -> List[Optional[np.ndarray]]:
+        """Cached embedding per key, or None for misses"""
+        results = []
+        missing = {}
+        for i, key in enumerate(keys):
+            vector = self._entries.get((model, key))
+            if vector is not None:
+                self._entries.move_to_end((model, key))
+                self.hits += 1
+            else:
+                missing.setdefault(key, []).append(i)
+            results.append(vector)
+
+        if missing and self._db is not None:
+            for key, vector in self._db_get(model, list(missing)).items():
+                self._remember(model, key, vector)
+                for i in missing.pop(key):
+                    results[i] = vector
+                    self.disk_hits += 1
+
+        self.misses += sum(len(positions) for positions in missing.values())
+        return results
+
+    def put_many(self, model: str, keys: List[bytes], vectors: np.ndarray):
+        for key, vector in zip(keys, vectors):
+            # Copy, so cached rows don't keep the caller's whole batch alive
+            self._remember(model, key, np.array(vector, dtype=np.float32))
+        if self._db is not None:
+            self._db_put(model, keys, vectors)
+
+    def _remember(self, model: str, key: bytes, vector: np.ndarray):
+        self._entries[(model, key)] = vector
+        self._entries.move_to_end((model, key))
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _db_get(self, model: str, keys: List[bytes]) -> Dict[bytes, np.ndarray]:
+        found = {}
+        try:
+            for start in range(0, len(keys), SQLITE_BATCH_SIZE):
+                batch = keys[start:start + SQLITE_BATCH_SIZE]
+                rows = self._db.execute(
+                    f"SELECT text_hash, embedding FROM embeddings "
+                    f"WHERE model = ? AND text_hash IN ({','.join('?' * len(batch))})",
+                    [model, *batch]
+                )
+                for key, blob in rows:
+                    found[key] = np.frombuffer(blob, dtype=np.float32)
+        except sqlite3.Error as e:
+            # The cache is an optimization; encode on any database problem
+            logger.warning(f"Embedding cache read failed: {e}")
+        return found
+
+    def _db_put(self, model: str, keys: List[bytes], vectors: np.ndarray):
+        try:
+            with self._db:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (model, text_hash, embedding) VALUES (?, ?, ?)",
+                    [(model, key, np.asarray(vector, dtype=np.float32).tobytes())
+                     for key, vector in zip(keys, vectors)]
+                )
+            self._db_writes += len(keys)
+            if self.db_max_rows and self._db_writes >= self.db_max_rows // 10:
+                self._db_writes = 0
+                self._db_prune()
+        except sqlite3.Error as e:
+            logger.warning(f"Embedding cache write failed: {e}")
+
+    def _db_prune(self):
+        """Drop the oldest rows beyond db_max_rows"""
+        with self._db:
+            self._db.execute(
+                "DELETE FROM embeddings WHERE rowid <= "
+                "(SELECT MAX(rowid) FROM embeddings) - ?",
+                (self.db_max_rows,)
+            )
+
+    def stats(self) -> Dict[str, Any]:
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "max_entries": self.max_entries,
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "hit_rate": round((self.hits + self.disk_hits) / lookups, 4) if lookups else 0.0,
+            "db_path": self.db_path or None,
+        }
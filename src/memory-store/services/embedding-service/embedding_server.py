@@ -1,29 +1,199 @@
 #!/usr/bin/env python3
 
 import os
+import asyncio
+import gc
 import logging
+import math
+import signal
 import time
-from typing import List 
+from typing import Any, Dict, List, Optional
+from concurrent.futures import ThreadPoolExecutor
 from contextlib import asynccontextmanager
 
+# Startup phase timings are measured from here, before the heavy imports
+PROCESS_STARTED = time.perf_counter()
+
 # import torch
+import numpy as np
 import uvicorn
-from fastapi import FastAPI, HTTPException
+from fastapi import FastAPI, HTTPException, Response
 from pydantic import BaseModel
 from sentence_transformers import SentenceTransformer
 
+import metrics
+from convert_model import is_converted, local_model_dir
+from embedding_cache import EmbeddingCache, text_key
+from model_registry import ModelRegistry, UnknownModelError
+from reranker import Reranker
+
+IMPORTS_DONE = time.perf_counter()
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
 
-# Global model variable
-model = None
+# Loaded models, keyed by name; created on startup
+registry = None
+
+DEFAULT_MODEL = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+
+AVAILABLE_MODELS = {
+    "all-MiniLM-L6-v2": {
+        "description": "Lightweight, fast, good quality (384 dimensions)",
+        "size": "~90MB",
+        "performance": "Fast"
+    },
+    "all-mpnet-base-v2": {
+        "description": "High quality, slower (768 dimensions)",
+        "size": "~420MB", 
+        "performance": "Best quality"
+    },
+    "all-MiniLM-L12-v2": {
+        "description": "Balance of speed and quality (384 dimensions)",
+        "size": "~120MB",
+        "performance": "Good balance"
+    },
+    "paraphrase-multilingual-MiniLM-L12-v2": {
+        "description": "Multilingual support (384 dimensions)",
+        "size": "~120MB",
+        "performance": "Multilingual"
+    }
+}
+
+# Models requests may select with model_name (the default is always allowed)
+ALLOWED_MODELS = [
+    name.strip() for name in os.getenv("EMBEDDING_ALLOWED_MODELS", ",".join(AVAILABLE_MODELS)).split(",")
+    if name.strip()
+]
+# Loaded models beyond the default are evicted least recently used first
+# once their estimated memory exceeds MODEL_CACHE_MAX_MB, and after
+# MODEL_IDLE_TTL seconds without requests (0 disables either)
+MODEL_CACHE_MAX_MB = float(os.getenv("MODEL_CACHE_MAX_MB", "2048"))
+MODEL_IDLE_TTL = float(os.getenv("MODEL_IDLE_TTL", "1800"))
+
+# Tokenizing is cheap, so /tokenize accepts far more texts than /embeddings
+MAX_TOKENIZE_TEXTS = int(os.getenv("MAX_TOKENIZE_TEXTS", "5000"))
+
+# Admission control for /embeddings, by the tokens the model will process
+# (each text truncated to max_seq_length, special tokens included): at
+# most MAX_REQUEST_TOKENS per request, and per worker a sustained
+# EMBEDDING_TOKENS_PER_SECOND with bursts up to EMBEDDING_TOKEN_BURST
+# (0 disables the rate limit), which also caps the request size. Clients
+# read these from /limits.
+MAX_REQUEST_TEXTS = int(os.getenv("MAX_REQUEST_TEXTS", "1000"))
+MAX_REQUEST_TOKENS = int(os.getenv("MAX_REQUEST_TOKENS", "32768"))
+EMBEDDING_TOKENS_PER_SECOND = float(os.getenv("EMBEDDING_TOKENS_PER_SECOND", "0"))
+EMBEDDING_TOKEN_BURST = int(os.getenv("EMBEDDING_TOKEN_BURST", "0")) or max(
+    MAX_REQUEST_TOKENS, int(EMBEDDING_TOKENS_PER_SECOND)
+)
+
+# Length-bucketed encoding: each batch holds at most this many padded tokens
+# (batch size x longest sequence in the batch), and at most this many texts
+ENCODE_TOKEN_BUDGET = int(os.getenv("ENCODE_TOKEN_BUDGET", "8192"))
+ENCODE_MAX_BATCH_SIZE = int(os.getenv("ENCODE_MAX_BATCH_SIZE", "64"))
+
+# Inference backend: "torch" (SentenceTransformer) or "onnx" (ONNX Runtime,
+# optionally with dynamic int8 weights). ONNX exports are cached on disk with
+# their parity against the torch model, measured at export time;
+# ONNX_PARITY_CHECK re-measures it at every start, loading the torch model.
+EMBEDDING_BACKEND = os.getenv("EMBEDDING_BACKEND", "torch")
+ONNX_CACHE_DIR = os.getenv("ONNX_CACHE_DIR", os.path.expanduser("~/.cache/onnx"))
+ONNX_QUANTIZE = os.getenv("ONNX_QUANTIZE", "false").lower() == "true"
+ONNX_THREADS = int(os.getenv("ONNX_THREADS", "0"))
+ONNX_PARITY_CHECK = os.getenv("ONNX_PARITY_CHECK", "false").lower() == "true"
+ONNX_PARITY_TOLERANCE = float(os.getenv("ONNX_PARITY_TOLERANCE", "0.01"))
+
+# EMBEDDING_WORKERS > 1 forks that many server processes sharing one
+# listening socket, each pinned to its own subset of cores and running
+# EMBEDDING_WORKER_THREADS torch/ONNX threads (default: its core count).
+# EMBEDDING_RELOAD=true is for development only (single process).
+EMBEDDING_WORKERS = int(os.getenv("EMBEDDING_WORKERS", "1"))
+EMBEDDING_WORKER_THREADS = int(os.getenv("EMBEDDING_WORKER_THREADS", "0"))
+EMBEDDING_RELOAD = os.getenv("EMBEDDING_RELOAD", "false").lower() == "true"
+
+# (name, model, load time) of the default model when loaded before forking workers
+preloaded_model = None
+
+# Models converted with convert_model.py under this directory load from
+# their local safetensors artifact instead of through the hub cache
+EMBEDDING_MODEL_DIR = os.getenv("EMBEDDING_MODEL_DIR", "")
+# Encode passes over representative batches before the server reports
+# healthy, so the first requests do not pay allocator and kernel warmup
+EMBEDDING_WARMUP_BATCHES = int(os.getenv("EMBEDDING_WARMUP_BATCHES", "2"))
+
+# Seconds spent in each startup phase, reported by /health
+startup_timings: Dict[str, float] = {}
+
+# Embeddings of recently seen texts, keyed by model and text hash:
+# EMBEDDING_CACHE_SIZE entries in memory (0 disables), plus an optional
+# SQLite tier at EMBEDDING_CACHE_DB holding up to EMBEDDING_CACHE_DB_MAX_ROWS
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", "10000"))
+EMBEDDING_CACHE_DB = os.getenv("EMBEDDING_CACHE_DB", "")
+EMBEDDING_CACHE_DB_MAX_ROWS = int(os.getenv("EMBEDDING_CACHE_DB_MAX_ROWS", "1000000"))
+
+embedding_cache = None
+
+# Request tokenizing and encoding run on this one thread, off the event loop,
+# so /health, /limits and /rerank stay responsive during large batches. One
+# thread keeps them serialized as they were on the event loop: the
+# tokenizers are not safe to call concurrently, nor is the cache
+model_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix="encode")
+
+
+async def run_on_model_thread(func, *args):
+    return await asyncio.get_running_loop().run_in_executor(model_executor, func, *args)
+
+
+# Cross-encoder for /rerank, loaded on first use. Requests carry at most
+# RERANK_MAX_DOCUMENTS documents, truncated to RERANK_MAX_LENGTH tokens
+# together with the query, and scored RERANK_BATCH_SIZE pairs at a time
+RERANK_MODEL = os.getenv("RERANK_MODEL", "cross-encoder/ms-marco-MiniLM-L-6-v2")
+RERANK_MAX_DOCUMENTS = int(os.getenv("RERANK_MAX_DOCUMENTS", "100"))
+RERANK_MAX_LENGTH = int(os.getenv("RERANK_MAX_LENGTH", "256"))
+RERANK_BATCH_SIZE = int(os.getenv("RERANK_BATCH_SIZE", "16"))
+
+reranker = None
+
+
+class TokenBucket:
+    """Admits work by token count at a sustained rate, with bursts up to capacity"""
+    
+    def __init__(self, rate: float, capacity: int):
+        self.rate = rate
+        self.capacity = capacity
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+    
+    def _refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+    
+    def available(self) -> int:
+        self._refill()
+        return int(self.tokens)
+    
+    def try_acquire(self, tokens: int) -> float:
+        """Take tokens if available and return 0, else seconds until they will be"""
+        self._refill()
+        if tokens <= self.tokens:
+            self.tokens -= tokens
+            return 0.0
+        return (tokens - self.tokens) / self.rate
+
+
+token_bucket = TokenBucket(EMBEDDING_TOKENS_PER_SECOND, EMBEDDING_TOKEN_BURST) if EMBEDDING_TOKENS_PER_SECOND else None
+
+
+def max_request_tokens() -> int:
+    """Largest admissible request; one over the rate limit's burst could never be admitted"""
+    return min(MAX_REQUEST_TOKENS, token_bucket.capacity) if token_bucket else MAX_REQUEST_TOKENS
 
 
 class EmbeddingRequest(BaseModel):
     texts: List[str]
-    model_name: str = "all-MiniLM-L6-v2"  # Default lightweight model
+    model_name: Optional[str] = None  # Server default (EMBEDDING_MODEL) if unset
 
 
 class EmbeddingResponse(BaseModel):
@@ -31,6 +201,32 @@ class EmbeddingResponse(BaseModel):
     model_name: str
     dimensions: int
     processing_time: float
+    cache_hits: int = 0
+
+
+class TokenizeRequest(BaseModel):
+    texts: List[str]
+    model_name: Optional[str] = None
+
+
+class TokenizeResponse(BaseModel):
+    token_counts: List[int]
+    model_name: str
+    max_seq_length: int
+
+
+class RerankRequest(BaseModel):
+    query: str
+    documents: List[str]
+    # Stop scoring after this long; unscored documents get null scores
+    budget_ms: Optional[float] = None
+
+
+class RerankResponse(BaseModel):
+    scores: List[Optional[float]]
+    model_name: str
+    processing_time: float
+    complete: bool
 
 
 class HealthResponse(BaseModel):
@@ -39,31 +235,259 @@ class HealthResponse(BaseModel):
     model_name: str
     device: str
     dimensions: int
+    backend: str
+    loaded_models: List[str]
+    startup_timings: Dict[str, float]
+    cache: Optional[Dict[str, Any]] = None
+
+
+def model_display_name(model) -> str:
+    """Name or path of the model behind either backend"""
+    return getattr(model, 'model_name', None) or model._modules['0'].auto_model.config.name_or_path
+
+
+def model_backend(model) -> str:
+    """Backend label for health reporting"""
+    if isinstance(model, SentenceTransformer):
+        return "torch"
+    return "onnx-int8" if model.quantized else "onnx"
+
+
+def load_sentence_transformer(model_name: str, device: str) -> SentenceTransformer:
+    """Load a model from its converted local artifact if there is one, else by name"""
+    model_dir = local_model_dir(EMBEDDING_MODEL_DIR, model_name) if EMBEDDING_MODEL_DIR else None
+    if not model_dir or not is_converted(model_dir):
+        return SentenceTransformer(model_name, device=device)
+    
+    logger.info("Loading %s from %s", model_name, model_dir)
+    model = SentenceTransformer(model_dir, device=device)
+    # Report the model by name rather than by artifact path
+    model.model_name = model_name
+    return model
+
+
+def load_model(model_name: str, device: str):
+    """Load a model with the configured backend"""
+    if EMBEDDING_BACKEND != "onnx":
+        return load_sentence_transformer(model_name, device)
+    
+    from onnx_backend import (OnnxSentenceEncoder, check_parity, export_checked, export_lock, is_exported,
+                              onnx_model_dir, read_parity, record_parity)
+    
+    model_dir = onnx_model_dir(ONNX_CACHE_DIR, model_name)
+    reference = load_sentence_transformer(model_name, device) if ONNX_PARITY_CHECK else None
+    # Workers starting together export once; the others wait and load the export
+    with export_lock(model_dir):
+        if not is_exported(model_dir, ONNX_QUANTIZE):
+            logger.info("Exporting %s to ONNX in %s", model_name, model_dir)
+            reference = reference or load_sentence_transformer(model_name, device)
+            export_checked(reference, model_dir, quantize=ONNX_QUANTIZE)
+    
+    encoder = OnnxSentenceEncoder(model_dir, quantize=ONNX_QUANTIZE, num_threads=ONNX_THREADS)
+    
+    # Parity is measured when the model is exported; ONNX_PARITY_CHECK re-measures it here
+    if ONNX_PARITY_CHECK:
+        record_parity(model_dir, check_parity(reference, encoder), ONNX_QUANTIZE)
+    min_cosine = read_parity(model_dir, ONNX_QUANTIZE)
+    if min_cosine is None:
+        logger.warning("No ONNX parity result for %s in %s; export it with convert_model.py --onnx-dir "
+                       "or set ONNX_PARITY_CHECK=true", model_name, model_dir)
+    elif min_cosine < 1 - ONNX_PARITY_TOLERANCE:
+        logger.error(
+            "ONNX parity check failed for %s (min cosine %.6f, tolerance %.4f), using torch backend",
+            model_name, min_cosine, ONNX_PARITY_TOLERANCE
+        )
+        return reference or load_sentence_transformer(model_name, device)
+    else:
+        logger.info("ONNX parity check passed for %s (min cosine %.6f)", model_name, min_cosine)
+    
+    # Drop the torch weights; only the ONNX session is kept
+    return encoder
+
+
+def token_lengths(model, texts: List[str], truncate: bool = True) -> List[int]:
+    """Token count per text; with truncate, as the model will see it"""
+    if not texts:
+        return []
+    
+    if truncate:
+        encoded = model.tokenizer(
+            texts,
+            truncation=True,
+            max_length=model.max_seq_length,
+            return_attention_mask=False,
+            return_token_type_ids=False
+        )
+    else:
+        encoded = model.tokenizer(
+            texts,
+            add_special_tokens=False,
+            return_attention_mask=False,
+            return_token_type_ids=False,
+            verbose=False
+        )
+    return [len(ids) for ids in encoded['input_ids']]
+
+
+def encode_by_length(model, texts: List[str], lengths: Optional[List[int]] = None) -> np.ndarray:
+    """
+    Encode texts in buckets of similar token length.
+    
+    Texts are sorted by tokenized length and grouped so each batch pads to
+    a similar length and stays under ENCODE_TOKEN_BUDGET padded tokens:
+    short queries are encoded in large batches, long chunks in small ones,
+    and neither pads to the other. Embeddings are returned in input order.
+    Pass `lengths` if the truncated token lengths are already known.
+    """
+    if lengths is None:
+        lengths = token_lengths(model, texts)
+    order = sorted(range(len(texts)), key=lengths.__getitem__)
+    embeddings = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    
+    def flush(batch: List[int]):
+        start = time.perf_counter()
+        vectors = model.encode(
+            [texts[i] for i in batch],
+            batch_size=len(batch),
+            convert_to_numpy=True,
+            normalize_embeddings=True  # Normalize for cosine similarity
+        )
+        embeddings[batch] = vectors
+        metrics.ENCODE_SECONDS.observe(time.perf_counter() - start)
+        metrics.ENCODE_BATCH_TEXTS.observe(len(batch))
+    
+    batch = []
+    for i in order:
+        # Sorted ascending, so the new text is the longest in the batch
+        if batch and (len(batch) >= ENCODE_MAX_BATCH_SIZE or
+                      (len(batch) + 1) * lengths[i] > ENCODE_TOKEN_BUDGET):
+            flush(batch)
+            batch = []
+        batch.append(i)
+    if batch:
+        flush(batch)
+    
+    return embeddings
+
+
+async def get_model(model_name: Optional[str]):
+    """Resolve a request's model_name to a loaded model, loading it on first use"""
+    if registry is None or registry.default is None:
+        raise HTTPException(status_code=503, detail="Model not loaded")
+    
+    try:
+        return await registry.get(model_name)
+    except UnknownModelError:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Unknown model: {model_name} (available: {', '.join(sorted(registry.allowed_models))})"
+        )
+    except Exception as e:
+        logger.error("Failed to load model %s: %s", model_name, e)
+        raise HTTPException(status_code=503, detail=f"Failed to load model {model_name}")
+
+
+def encode_with_cache(model, cache_model: str, texts: List[str], lengths: Optional[List[int]] = None):
+    """
+    Encode texts, reusing cached embeddings.
+    
+    Only cache misses are encoded (each distinct text once), and the results
+    are merged with the hits in input order. Returns (embeddings, hits).
+    """
+    if embedding_cache is None:
+        return encode_by_length(model, texts, lengths), 0
+    
+    keys = [text_key(text) for text in texts]
+    cached = embedding_cache.get_many(cache_model, keys)
+    embeddings = np.empty((len(texts), model.get_sentence_embedding_dimension()), dtype=np.float32)
+    
+    misses = {}
+    for i, vector in enumerate(cached):
+        if vector is None:
+            misses.setdefault(keys[i], []).append(i)
+        else:
+            embeddings[i] = vector
+    
+    if misses:
+        miss_keys = list(misses)
+        first = [misses[key][0] for key in miss_keys]
+        encoded = encode_by_length(
+            model,
+            [texts[i] for i in first],
+            [lengths[i] for i in first] if lengths is not None else None
+        )
+        for key, vector in zip(miss_keys, encoded):
+            embeddings[misses[key]] = vector
+        embedding_cache.put_many(cache_model, miss_keys, encoded)
+    
+    hits = len(texts) - sum(len(positions) for positions in misses.values())
+    metrics.CACHE_LOOKUPS.labels("hit").inc(hits)
+    metrics.CACHE_LOOKUPS.labels("miss").inc(len(texts) - hits)
+    return embeddings, hits
+
+
+def warm_up(model, batches: int):
+    """Encode short and max-length texts, as real requests will"""
+    texts = ["warmup query"] * 8 + [" ".join(["warmup"] * model.max_seq_length)] * 4
+    for _ in range(batches):
+        encode_by_length(model, texts)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
-    """Load model on startup, cleanup on shutdown"""
-    global model
+    """Load the default model on startup, cleanup on shutdown"""
+    global registry, embedding_cache, reranker
     
     # Startup
-    model_name = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
-    logger.info("Loading embedding model: %s", model_name)
-    
     # device = "cuda" if torch.cuda.is_available() else "cpu"
     device = "cpu"
     logger.info("Using device: %s", device)
-        
-    model = SentenceTransformer(model_name, device=device)
+    
+    registry = ModelRegistry(
+        lambda name: load_model(name, device),
+        DEFAULT_MODEL,
+        ALLOWED_MODELS,
+        max_memory_mb=MODEL_CACHE_MAX_MB,
+        idle_ttl=MODEL_IDLE_TTL
+    )
+    if preloaded_model is not None:
+        registry.add(*preloaded_model)
+    model = await registry.get()
     logger.info(
-        "Model loaded successfully. Dimensions: %s",
+        "Model loaded successfully. Backend: %s, Dimensions: %s",
+        model_backend(model),
         model.get_sentence_embedding_dimension()
     )
     
+    # Workers warm up after forking, never in the launcher
+    warmup_start = time.perf_counter()
+    warm_up(model, EMBEDDING_WARMUP_BATCHES)
+    
+    startup_timings.update({
+        "imports": IMPORTS_DONE - PROCESS_STARTED,
+        "model_load": registry.load_time(DEFAULT_MODEL),
+        "warmup": time.perf_counter() - warmup_start,
+        "total": time.perf_counter() - PROCESS_STARTED,
+    })
+    logger.info("Ready in %.2fs (%s)", startup_timings["total"],
+                ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in startup_timings.items()))
+    
+    if EMBEDDING_CACHE_SIZE or EMBEDDING_CACHE_DB:
+        embedding_cache = EmbeddingCache(EMBEDDING_CACHE_SIZE, EMBEDDING_CACHE_DB, EMBEDDING_CACHE_DB_MAX_ROWS)
+        embedding_cache.open()
+    
+    reranker = Reranker(RERANK_MODEL, RERANK_BATCH_SIZE, RERANK_MAX_LENGTH, device)
+    
+    eviction_task = asyncio.create_task(registry.run_idle_eviction()) if MODEL_IDLE_TTL else None
+    
     yield
     
     # Shutdown
     logger.info("Shutting down embedding service")
+    if eviction_task:
+        eviction_task.cancel()
+    if embedding_cache:
+        embedding_cache.close()
 
 
 app = FastAPI(
@@ -72,12 +496,13 @@ app = FastAPI(
     version="0.1.0",
     lifespan=lifespan
 )
+app.middleware("http")(metrics.record_request)
 
 
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
     """Health check endpoint"""
-    global model
+    model = registry.default if registry else None
     
     if model is None:
         raise HTTPException(status_code=503, detail="Model not loaded")
@@ -85,34 +510,53 @@ async def health_check():
     return HealthResponse(
         status="healthy",
         model_loaded=True,
-        model_name=model._modules['0'].auto_model.config.name_or_path,
+        model_name=model_display_name(model),
         device=str(model.device),
-        dimensions=model.get_sentence_embedding_dimension()
+        dimensions=model.get_sentence_embedding_dimension(),
+        backend=model_backend(model),
+        loaded_models=registry.loaded(),
+        startup_timings={phase: round(seconds, 3) for phase, seconds in startup_timings.items()},
+        cache=embedding_cache.stats() if embedding_cache else None
     )
 
 
 @app.post("/embeddings", response_model=EmbeddingResponse)
 async def generate_embeddings(request: EmbeddingRequest):
     """Generate embeddings for input texts"""
-    global model
-    
-    if model is None:
-        raise HTTPException(status_code=503, detail="Model not loaded")
-    
     if not request.texts:
         raise HTTPException(status_code=400, detail="No texts provided")
     
-    if len(request.texts) > 100:
-        raise HTTPException(status_code=400, detail="Too many texts (max 100)")
+    if len(request.texts) > MAX_REQUEST_TEXTS:
+        raise HTTPException(status_code=400, detail=f"Too many texts (max {MAX_REQUEST_TEXTS})")
+    
+    model = await get_model(request.model_name)
+    
+    # Admit by the tokens the model will actually process, not text count
+    lengths = await run_on_model_thread(token_lengths, model, request.texts)
+    total_tokens = sum(lengths)
+    if total_tokens > max_request_tokens():
+        raise HTTPException(
+            status_code=413,
+            detail=f"Request too large: {total_tokens} tokens (max {max_request_tokens()})"
+        )
+    if token_bucket:
+        wait = token_bucket.try_acquire(total_tokens)
+        if wait:
+            raise HTTPException(
+                status_code=429,
+                detail=f"Token rate limit exceeded, retry in {wait:.1f}s",
+                headers={"Retry-After": str(math.ceil(wait))}
+            )
+    metrics.TOKENS.inc(total_tokens)
     
     try:
         start_time = time.time()
         
-        # Generate embeddings
-        embeddings = model.encode(
-            request.texts,
-            convert_to_numpy=True,
-            normalize_embeddings=True  # Normalize for cosine similarity
+        # Generate embeddings for cache misses, bucketed by token length;
+        # backends differ slightly, so they don't share cache entries
+        cache_model = f"{request.model_name or DEFAULT_MODEL}:{model_backend(model)}"
+        embeddings, cache_hits = await run_on_model_thread(
+            encode_with_cache, model, cache_model, request.texts, lengths
         )
         
         processing_time = time.time() - start_time
@@ -120,58 +564,252 @@ async def generate_embeddings(request: EmbeddingRequest):
         # Convert to list of lists for JSON serialization
         embeddings_list = embeddings.tolist()
         
-        logger.info(f"Generated embeddings for {len(request.texts)} texts in {processing_time:.3f}s")
+        logger.info(f"Generated embeddings for {len(request.texts)} texts "
+                    f"({cache_hits} cached) in {processing_time:.3f}s")
         
         return EmbeddingResponse(
             embeddings=embeddings_list,
-            model_name=model._modules['0'].auto_model.config.name_or_path,
+            model_name=model_display_name(model),
             dimensions=len(embeddings_list[0]),
-            processing_time=processing_time
+            processing_time=processing_time,
+            cache_hits=cache_hits
         )
         
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Failed to generate embeddings: {str(e)}")
 
 
+@app.post("/rerank", response_model=RerankResponse)
+async def rerank(request: RerankRequest):
+    """Score documents against a query with the cross-encoder, within an optional time budget"""
+    if not request.documents:
+        raise HTTPException(status_code=400, detail="No documents provided")
+    
+    if len(request.documents) > RERANK_MAX_DOCUMENTS:
+        raise HTTPException(status_code=400, detail=f"Too many documents (max {RERANK_MAX_DOCUMENTS})")
+    
+    try:
+        await reranker.get()
+    except Exception as e:
+        logger.error("Failed to load reranker %s: %s", RERANK_MODEL, e)
+        raise HTTPException(status_code=503, detail=f"Failed to load reranker {RERANK_MODEL}")
+    
+    start_time = time.time()
+    budget = request.budget_ms / 1000 if request.budget_ms else None
+    scores = await reranker.rerank(request.query, request.documents, budget)
+    processing_time = time.time() - start_time
+    
+    complete = all(score is not None for score in scores)
+    scored = sum(score is not None for score in scores)
+    metrics.RERANK_SECONDS.observe(processing_time)
+    metrics.RERANK_DOCUMENTS.labels("scored").inc(scored)
+    metrics.RERANK_DOCUMENTS.labels("unscored").inc(len(scores) - scored)
+    logger.info(f"Reranked {scored}/{len(scores)} documents "
+                f"in {processing_time:.3f}s")
+    
+    return RerankResponse(
+        scores=scores,
+        model_name=RERANK_MODEL,
+        processing_time=processing_time,
+        complete=complete
+    )
+
+
+@app.get("/limits")
+async def limits():
+    """Request limits for /embeddings, so clients can size their batches"""
+    model = registry.default if registry else None
+    return {
+        "max_request_texts": MAX_REQUEST_TEXTS,
+        "max_request_tokens": max_request_tokens(),
+        "tokens_per_second": EMBEDDING_TOKENS_PER_SECOND or None,
+        "token_burst": EMBEDDING_TOKEN_BURST if token_bucket else None,
+        "available_tokens": token_bucket.available() if token_bucket else None,
+        # Texts are truncated to this many tokens, so none costs more
+        "max_seq_length": model.max_seq_length if model else None,
+        "max_rerank_documents": RERANK_MAX_DOCUMENTS,
+    }
+
+
+@app.post("/tokenize", response_model=TokenizeResponse)
+async def tokenize(request: TokenizeRequest):
+    """Count model tokens per text, so clients can size chunks to the model limit"""
+    if len(request.texts) > MAX_TOKENIZE_TEXTS:
+        raise HTTPException(status_code=400, detail=f"Too many texts (max {MAX_TOKENIZE_TEXTS})")
+    
+    model = await get_model(request.model_name)
+    
+    # Counts exclude special tokens and are not truncated; the model adds
+    # [CLS]/[SEP] and silently drops anything past max_seq_length
+    token_counts = await run_on_model_thread(token_lengths, model, request.texts, False)
+    
+    return TokenizeResponse(
+        token_counts=token_counts,
+        model_name=model_display_name(model),
+        max_seq_length=model.max_seq_length
+    )
+
+
+@app.get("/metrics")
+async def prometheus_metrics() -> Response:
+    """Prometheus metrics, summed over workers in multiprocess mode"""
+    return metrics.metrics_response()
+
+
 @app.get("/models")
 async def list_available_models():
-    """List popular embedding models"""
+    """List popular embedding models and the ones currently loaded"""
+    model = registry.default if registry else None
     return {
-        "available_models": {
-            "all-MiniLM-L6-v2": {
-                "description": "Lightweight, fast, good quality (384 dimensions)",
-                "size": "~90MB",
-                "performance": "Fast"
-            },
-            "all-mpnet-base-v2": {
-                "description": "High quality, slower (768 dimensions)",
-                "size": "~420MB", 
-                "performance": "Best quality"
-            },
-            "all-MiniLM-L12-v2": {
-                "description": "Balance of speed and quality (384 dimensions)",
-                "size": "~120MB",
-                "performance": "Good balance"
-            },
-            "paraphrase-multilingual-MiniLM-L12-v2": {
-                "description": "Multilingual support (384 dimensions)",
-                "size": "~120MB",
-                "performance": "Multilingual"
-            }
-        },
-        "current_model": model._modules['0'].auto_model.config.name_or_path if model else None
+        "available_models": AVAILABLE_MODELS,
+        "allowed_models": sorted(registry.allowed_models) if registry else ALLOWED_MODELS,
+        "current_model": model_display_name(model) if model else None,
+        "reranker": reranker.stats() if reranker else None,
+        **(registry.stats() if registry else {})
     }
 
 
+def worker_cpu_sets(workers: int) -> List[Optional[set]]:
+    """Split the CPUs this process may use into one contiguous subset per worker"""
+    if not hasattr(os, "sched_getaffinity"):
+        return [None] * workers
+    
+    cpus = sorted(os.sched_getaffinity(0))
+    if workers >= len(cpus):
+        return [{cpus[i % len(cpus)]} for i in range(workers)]
+    
+    size, extra = divmod(len(cpus), workers)
+    cpu_sets = []
+    start = 0
+    for i in range(workers):
+        end = start + size + (1 if i < extra else 0)
+        cpu_sets.append(set(cpus[start:end]))
+        start = end
+    return cpu_sets
+
+
+def preload_default_model():
+    """Load the default model before forking, so workers share its weights copy-on-write"""
+    global preloaded_model
+    
+    if EMBEDDING_BACKEND == "onnx":
+        # ONNX Runtime sessions own thread pools that do not survive fork;
+        # each worker opens its own session on the shared export instead
+        return
+    
+    import torch
+    
+    # With one thread OpenMP never starts its pool, which would not survive
+    # fork either; workers raise the thread count after forking
+    torch.set_num_threads(1)
+    
+    logger.info("Preloading embedding model: %s", DEFAULT_MODEL)
+    start = time.perf_counter()
+    model = load_model(DEFAULT_MODEL, "cpu")
+    preloaded_model = (DEFAULT_MODEL, model, time.perf_counter() - start)
+
+
+def configure_worker(worker: int, cpus: Optional[set]):
+    """Pin a forked worker to its cores and size its inference thread pools"""
+    global ONNX_THREADS
+    
+    # Drop the launcher's handlers; uvicorn installs its own
+    signal.signal(signal.SIGTERM, signal.SIG_DFL)
+    signal.signal(signal.SIGINT, signal.SIG_DFL)
+    
+    if cpus:
+        os.sched_setaffinity(0, cpus)
+    threads = EMBEDDING_WORKER_THREADS or (len(cpus) if cpus else max(1, os.cpu_count() // EMBEDDING_WORKERS))
+    
+    import torch
+    
+    torch.set_num_threads(threads)
+    if not ONNX_THREADS:
+        ONNX_THREADS = threads
+    logger.info("Worker %d (pid %d): cpus %s, %d threads", worker, os.getpid(),
+                sorted(cpus) if cpus else "any", threads)
+
+
+def run_workers(host: str, port: int, workers: int):
+    """
+    Serve with `workers` forked processes accepting on one listening socket.
+    
+    The default model is loaded once before forking, so its weights are
+    shared copy-on-write rather than loaded per worker (models loaded later
+    are per worker). Workers that exit are restarted until the launcher gets
+    SIGTERM or SIGINT, which it forwards to them.
+    """
+    config = uvicorn.Config(app, host=host, port=port, log_level="info")
+    sock = config.bind_socket()
+    metrics.clear_multiproc_dir()
+    
+    preload_default_model()
+    # Keep the garbage collector from writing to (and so copying) the
+    # preloaded objects' pages in every worker
+    gc.freeze()
+    
+    cpu_sets = worker_cpu_sets(workers)
+    children = {}
+    stopping = False
+    
+    def spawn(worker: int):
+        pid = os.fork()
+        if pid == 0:
+            status = 1
+            try:
+                configure_worker(worker, cpu_sets[worker])
+                uvicorn.Server(config).run(sockets=[sock])
+                status = 0
+            finally:
+                os._exit(status)
+        children[pid] = worker
+    
+    def stop(signum, frame):
+        nonlocal stopping
+        stopping = True
+        for pid in list(children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+    
+    signal.signal(signal.SIGTERM, stop)
+    signal.signal(signal.SIGINT, stop)
+    
+    logger.info("Starting %d embedding workers on %s:%d", workers, host, port)
+    for worker in range(workers):
+        spawn(worker)
+    
+    while children:
+        try:
+            pid, status = os.wait()
+        except ChildProcessError:
+            break
+        worker = children.pop(pid, None)
+        metrics.mark_process_dead(pid)
+        if worker is None or stopping:
+            continue
+        logger.warning("Worker %d (pid %d) exited with status %d, restarting", worker, pid,
+                       os.waitstatus_to_exitcode(status))
+        time.sleep(1)
+        spawn(worker)
+    
+    sock.close()
+
+
 if __name__ == "__main__":
     port = int(os.getenv("PORT", 8001))
     host = os.getenv("HOST", "0.0.0.0")
     
-    uvicorn.run(
-        "embedding_server:app",
-        host=host,
-        port=port,
-        reload=True,
-        log_level="info"
-    )
-
+    if EMBEDDING_WORKERS > 1:
+        run_workers(host, port, EMBEDDING_WORKERS)
+    else:
+        # Reloading needs the import string; otherwise serve this module's app
+        # rather than importing it a second time
+        uvicorn.run(
+            "embedding_server:app" if EMBEDDING_RELOAD else app,
+            host=host,
+            port=port,
+            reload=EMBEDDING_RELOAD,
+            log_level="info"
+        )
@@ -0,0 +1,84 @@
+"""
+Prometheus metrics for the embedding server, served at /metrics.
+
+With EMBEDDING_WORKERS > 1 every worker keeps its own counters; set
+PROMETHEUS_MULTIPROC_DIR (before the server starts) and /metrics, answered
+by whichever worker accepts the scrape, sums the values of all of them.
+"""
+
+import os
+import time
+
+from prometheus_client import (
+    CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Gauge, Histogram, generate_latest, multiprocess
+)
+from starlette.requests import Request
+from starlette.responses import Response
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR", "")
+if MULTIPROC_DIR:
+    os.makedirs(MULTIPROC_DIR, exist_ok=True)
+
+REQUESTS = Counter(
+    "embedding_http_requests_total", "HTTP requests by endpoint and status", ["method", "endpoint", "status"])
+REQUEST_SECONDS = Histogram(
+    "embedding_http_request_seconds", "HTTP request latency by endpoint", ["method", "endpoint"])
+IN_PROGRESS = Gauge(
+    "embedding_http_requests_in_progress", "Requests being served, queued or running",
+    multiprocess_mode="livesum")
+
+ENCODE_BATCH_TEXTS = Histogram(
+    "embedding_encode_batch_texts", "Texts per model encode batch",
+    buckets=(1, 2, 4, 8, 16, 32, 64, 128, 256))
+ENCODE_SECONDS = Histogram(
+    "embedding_encode_seconds", "Model encode time per batch",
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0))
+TOKENS = Counter("embedding_tokens_total", "Model tokens admitted to /embeddings")
+CACHE_LOOKUPS = Counter("embedding_cache_lookups_total", "Embedding cache lookups by result", ["result"])
+
+RERANK_SECONDS = Histogram(
+    "embedding_rerank_seconds", "Cross-encoder scoring time per /rerank request",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.2, 0.3, 0.5, 1.0, 2.5, 5.0))
+RERANK_DOCUMENTS = Counter(
+    "embedding_rerank_documents_total", "Documents sent to /rerank, scored or left unscored at the budget",
+    ["result"])
+
+
+def mark_process_dead(pid: int):
+    """Drop a dead worker's live gauges (multiprocess mode only)"""
+    if MULTIPROC_DIR:
+        multiprocess.mark_process_dead(pid)
+
+
+def clear_multiproc_dir():
+    """Remove values left by a previous run before workers start"""
+    if MULTIPROC_DIR:
+        for name in os.listdir(MULTIPROC_DIR):
+            if name.endswith(".db"):
+                os.remove(os.path.join(MULTIPROC_DIR, name))
+
+
+async def record_request(request: Request, call_next):
+    """HTTP middleware: count and time requests by route template"""
+    IN_PROGRESS.inc()
+    start = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        return response
+    finally:
+        IN_PROGRESS.dec()
+        route = request.scope.get("route")
+        endpoint = route.path if route else "unmatched"
+        REQUESTS.labels(request.method, endpoint, str(status)).inc()
+        REQUEST_SECONDS.labels(request.method, endpoint).observe(time.perf_counter() - start)
+
+
+def metrics_response() -> Response:
+    if MULTIPROC_DIR:
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    else:
+        registry = REGISTRY
+    return Response(generate_latest(registry), media_type=CONTENT_TYPE_LATEST)
@@ -0,0 +1,188 @@
+"""
+Registry of loaded embedding models.
+
+Models are loaded on first request (in a worker thread, one load per name
+at a time) and kept in an LRU bounded by an estimated memory budget. The
+default model is pinned; other models are evicted when the budget is
+exceeded or when they have been idle for longer than the idle TTL.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, Iterable, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+def process_rss_bytes() -> Optional[int]:
+    """Resident set size of this process, if /proc is available"""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        return None
+
+
+def model_memory_bytes(model) -> int:
+    """Estimated resident size of a model: weights for torch, the model file for ONNX"""
+    if hasattr(model, "parameters"):
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(tensor.numel() * tensor.element_size() for tensor in tensors)
+    model_path = getattr(model, "model_path", None)
+    if model_path and os.path.exists(model_path):
+        return os.path.getsize(model_path)
+    return 0
+
+
+class UnknownModelError(ValueError):
+    """Requested model is not in the registry's allowed models"""
+
+
+class LoadedModel:
+    """A loaded model and its bookkeeping"""
+
+    def __init__(self, name: str, model, load_time: float, memory_bytes: int, rss_delta: Optional[int]):
+        self.name = name
+        self.model = model
+        self.load_time = load_time
+        self.memory_bytes = memory_bytes
+        self.rss_delta = rss_delta
+        self.loaded_at = time.time()
+        self.last_used = time.monotonic()
+        self.requests = 0
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "name": self.name,
+            "load_time": round(self.load_time, 3),
+            "memory_mb": round(self.memory_bytes / 2**20, 1),
+            "rss_delta_mb": round(self.rss_delta / 2**20, 1) if self.rss_delta is not None else None,
+            "requests": self.requests,
+            "idle_seconds": round(time.monotonic() - self.last_used, 1),
+        }
+
+
+class ModelRegistry:
+    """Lazily loaded, memory-bounded LRU of embedding models"""
+
+    def __init__(self, loader: Callable[[str], Any], default_model: str, allowed_models: Iterable[str],
+                 max_memory_mb: float = 0, idle_ttl: float = 0):
+        self.loader = loader
+        self.default_model = default_model
+        self.allowed_models = set(allowed_models) | {default_model}
+        # 0 disables the memory bound / idle eviction
+        self.max_memory_bytes = int(max_memory_mb * 2**20)
+        self.idle_ttl = idle_ttl
+        self._models: "OrderedDict[str, LoadedModel]" = OrderedDict()
+        self._locks: Dict[str, asyncio.Lock] = {}
+        self.evictions = 0
+
+    @property
+    def default(self):
+        """The default model, or None before it is loaded"""
+        entry = self._models.get(self.default_model)
+        return entry.model if entry else None
+
+    def loaded(self) -> List[str]:
+        return list(self._models)
+
+    def load_time(self, name: str) -> float:
+        entry = self._models.get(name)
+        return entry.load_time if entry else 0.0
+
+    def memory_bytes(self) -> int:
+        return sum(entry.memory_bytes for entry in self._models.values())
+
+    def add(self, name: str, model, load_time: float):
+        """Register a model loaded elsewhere (e.g. before forking workers)"""
+        self._models[name] = LoadedModel(name, model, load_time, model_memory_bytes(model), None)
+        self._evict_over_budget(keep=name)
+
+    async def get(self, name: Optional[str] = None):
+        """Return a loaded model by name (default if None), loading it if needed"""
+        name = name or self.default_model
+        if name not in self.allowed_models:
+            raise UnknownModelError(name)
+
+        entry = self._models.get(name)
+        if entry is None:
+            lock = self._locks.setdefault(name, asyncio.Lock())
+            async with lock:
+                entry = self._models.get(name)
+                if entry is None:
+                    entry = await self._load(name)
+
+        entry.last_used = time.monotonic()
+        entry.requests += 1
+        if name in self._models:
+            self._models.move_to_end(name)
+        return entry.model
+
+    async def _load(self, name: str) -> LoadedModel:
+        logger.info("Loading embedding model: %s", name)
+        rss_before = process_rss_bytes()
+        start = time.perf_counter()
+
+        # Loading can take seconds to minutes; keep serving loaded models meanwhile
+        model = await asyncio.get_running_loop().run_in_executor(None, self.loader, name)
+
+        load_time = time.perf_counter() - start
+        rss_after = process_rss_bytes()
+        rss_delta = rss_after - rss_before if rss_before is not None and rss_after is not None else None
+        entry = LoadedModel(name, model, load_time, model_memory_bytes(model), rss_delta)
+        self._models[name] = entry
+        logger.info("Loaded %s in %.1fs (%.1f MB)", name, load_time, entry.memory_bytes / 2**20)
+
+        self._evict_over_budget(keep=name)
+        return entry
+
+    def _evict(self, name: str, reason: str):
+        entry = self._models.pop(name)
+        self.evictions += 1
+        # Requests already holding the model finish with it; the memory is
+        # released once they drop their references
+        logger.info("Evicted %s (%s, %.1f MB, idle %.0fs)", name, reason,
+                    entry.memory_bytes / 2**20, time.monotonic() - entry.last_used)
+
+    def _evict_over_budget(self, keep: str):
+        if not self.max_memory_bytes:
+            return
+        for name in list(self._models):
+            if self.memory_bytes() <= self.max_memory_bytes:
+                break
+            if name not in (self.default_model, keep):
+                self._evict(name, "memory budget")
+        if self.memory_bytes() > self.max_memory_bytes:
+            logger.warning("Loaded models use %.1f MB, over the %.1f MB budget",
+                           self.memory_bytes() / 2**20, self.max_memory_bytes / 2**20)
+
+    def evict_idle(self) -> List[str]:
+        """Evict non-default models idle for longer than the idle TTL"""
+        if not self.idle_ttl:
+            return []
+        now = time.monotonic()
+        idle = [name for name, entry in self._models.items()
+                if name != self.default_model and now - entry.last_used > self.idle_ttl]
+        for name in idle:
+            self._evict(name, "idle")
+        return idle
+
+    async def run_idle_eviction(self):
+        """Background task: periodically evict idle models"""
+        interval = max(1.0, self.idle_ttl / 4)
+        while True:
+            await asyncio.sleep(interval)
+            self.evict_idle()
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "default_model": self.default_model,
+            "loaded_models": [entry.stats() for entry in self._models.values()],
+            "memory_mb": round(self.memory_bytes() / 2**20, 1),
+            "max_memory_mb": round(self.max_memory_bytes / 2**20, 1) if self.max_memory_bytes else None,
+            "idle_ttl": self.idle_ttl or None,
+            "evictions": self.evictions,
+        }
@@ -0,0 +1,255 @@
+#!/usr/bin/env python3
+"""
+ONNX Runtime backend for the embedding server.
+
+Exports the transformer of a SentenceTransformer to ONNX (optionally with
+dynamic int8 weight quantization) and runs it with ONNX Runtime on CPU,
+applying the model's pooling in NumPy. OnnxSentenceEncoder exposes the
+parts of the SentenceTransformer interface the server uses, so either can
+serve requests.
+
+Export a model ahead of time with:
+
+    python onnx_backend.py all-MiniLM-L6-v2 /models/onnx/all-MiniLM-L6-v2 --quantize
+"""
+
+import fcntl
+import inspect
+import json
+import logging
+import os
+import tempfile
+from contextlib import contextmanager
+from typing import List, Optional
+
+import numpy as np
+import onnxruntime as ort
+from transformers import AutoTokenizer
+
+logger = logging.getLogger(__name__)
+
+ENCODER_CONFIG = "encoder.json"
+MODEL_FILE = "model.onnx"
+QUANTIZED_MODEL_FILE = "model.int8.onnx"
+# Min cosine against the torch model per model file, measured at export time
+PARITY_FILE = "parity.json"
+
+# Varied lengths and vocabulary, including text past max_seq_length
+PARITY_TEXTS = [
+    "Hello world",
+    "How do I deploy services to the compute cluster?",
+    "Configure ARM64 node affinity and resource limits for Kubernetes deployments.",
+    "Café résumé naïve 世界 🚀",
+    "ansible-playbook -i build/etc/ansible/hosts build/playbooks/node/build.yml --ask-vault-pass",
+    " ".join(["Encrypted vault files keep secrets out of the repository."] * 60),
+]
+
+
+def onnx_model_dir(cache_dir: str, model_name: str) -> str:
+    """Directory holding the exported artifacts for a model"""
+    return os.path.join(cache_dir, model_name.replace("/", "__"))
+
+
+def is_exported(model_dir: str, quantize: bool = False) -> bool:
+    """Whether model_dir already holds an export (and its int8 variant, if asked)"""
+    model_file = QUANTIZED_MODEL_FILE if quantize else MODEL_FILE
+    return (os.path.exists(os.path.join(model_dir, ENCODER_CONFIG)) and
+            os.path.exists(os.path.join(model_dir, model_file)))
+
+
+@contextmanager
+def export_lock(model_dir: str):
+    """Exclusive file lock around exporting model_dir, across processes"""
+    os.makedirs(os.path.dirname(os.path.abspath(model_dir)), exist_ok=True)
+    with open(f"{model_dir}.lock", "w") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+
+def export_model(model, model_dir: str, quantize: bool = False, opset: int = 14) -> str:
+    """Export a SentenceTransformer's transformer and tokenizer to model_dir"""
+    import torch
+
+    transformer = model._modules['0']
+    pooling = model._modules['1']
+    auto_model = transformer.auto_model
+    tokenizer = transformer.tokenizer
+
+    os.makedirs(model_dir, exist_ok=True)
+    model_path = os.path.join(model_dir, MODEL_FILE)
+
+    if not os.path.exists(model_path):
+        dummy = tokenizer(["export the encoder"], return_tensors="pt")
+        input_names = [name for name in ("input_ids", "attention_mask", "token_type_ids") if name in dummy]
+        dynamic_axes = {name: {0: "batch", 1: "sequence"} for name in input_names}
+        dynamic_axes["last_hidden_state"] = {0: "batch", 1: "sequence"}
+
+        # Newer torch defaults to the dynamo exporter (which needs onnxscript);
+        # the TorchScript exporter handles these encoders and dynamic_axes
+        export_options = {}
+        if "dynamo" in inspect.signature(torch.onnx.export).parameters:
+            export_options["dynamo"] = False
+
+        auto_model.eval()
+        with torch.no_grad():
+            torch.onnx.export(
+                auto_model,
+                tuple(dummy[name] for name in input_names),
+                model_path,
+                input_names=input_names,
+                output_names=["last_hidden_state"],
+                dynamic_axes=dynamic_axes,
+                opset_version=opset,
+                do_constant_folding=True,
+                **export_options
+            )
+        logger.info("Exported ONNX model to %s", model_path)
+
+    if quantize and not os.path.exists(os.path.join(model_dir, QUANTIZED_MODEL_FILE)):
+        from onnxruntime.quantization import QuantType, quantize_dynamic
+
+        quantize_dynamic(
+            model_path,
+            os.path.join(model_dir, QUANTIZED_MODEL_FILE),
+            weight_type=QuantType.QInt8
+        )
+        logger.info("Quantized ONNX model to int8")
+
+    tokenizer.save_pretrained(model_dir)
+    with open(os.path.join(model_dir, ENCODER_CONFIG), "w") as f:
+        json.dump({
+            "model_name": auto_model.config.name_or_path,
+            "max_seq_length": model.max_seq_length,
+            "dimensions": model.get_sentence_embedding_dimension(),
+            "pooling": "cls" if pooling.pooling_mode_cls_token else "mean",
+        }, f)
+
+    return model_dir
+
+
+class OnnxSentenceEncoder:
+    """SentenceTransformer-compatible encoder backed by an ONNX Runtime session"""
+
+    device = "cpu"
+
+    def __init__(self, model_dir: str, quantize: bool = False, num_threads: int = 0):
+        with open(os.path.join(model_dir, ENCODER_CONFIG)) as f:
+            config = json.load(f)
+
+        self.model_name = config["model_name"]
+        self.max_seq_length = config["max_seq_length"]
+        self.dimensions = config["dimensions"]
+        self.pooling = config["pooling"]
+        self.quantized = quantize
+        self.tokenizer = AutoTokenizer.from_pretrained(model_dir)
+
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        if num_threads:
+            options.intra_op_num_threads = num_threads
+        self.model_path = os.path.join(model_dir, QUANTIZED_MODEL_FILE if quantize else MODEL_FILE)
+        self.session = ort.InferenceSession(
+            self.model_path,
+            options,
+            providers=["CPUExecutionProvider"]
+        )
+        self.input_names = {model_input.name for model_input in self.session.get_inputs()}
+
+    def get_sentence_embedding_dimension(self) -> int:
+        return self.dimensions
+
+    def encode(self, texts: List[str], batch_size: int = 32, convert_to_numpy: bool = True,
+               normalize_embeddings: bool = False, **kwargs) -> np.ndarray:
+        """Encode texts to a (len(texts), dimensions) float32 array"""
+        embeddings = np.empty((len(texts), self.dimensions), dtype=np.float32)
+
+        for start in range(0, len(texts), batch_size):
+            features = self.tokenizer(
+                texts[start:start + batch_size],
+                padding=True,
+                truncation=True,
+                max_length=self.max_seq_length,
+                return_tensors="np"
+            )
+            inputs = {name: value.astype(np.int64) for name, value in features.items()
+                      if name in self.input_names}
+            token_embeddings = self.session.run(None, inputs)[0]
+
+            if self.pooling == "cls":
+                pooled = token_embeddings[:, 0]
+            else:
+                mask = features["attention_mask"][..., None].astype(np.float32)
+                pooled = (token_embeddings * mask).sum(axis=1) / np.clip(mask.sum(axis=1), 1e-9, None)
+
+            embeddings[start:start + len(pooled)] = pooled
+
+        if normalize_embeddings:
+            embeddings /= np.clip(np.linalg.norm(embeddings, axis=1, keepdims=True), 1e-12, None)
+
+        return embeddings
+
+
+def check_parity(reference, candidate, texts: Optional[List[str]] = None) -> float:
+    """Lowest cosine similarity between two encoders' embeddings of the same texts"""
+    texts = texts or PARITY_TEXTS
+    expected = reference.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    actual = candidate.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
+    return float(np.min(np.sum(expected * actual, axis=1)))
+
+
+def read_parity(model_dir: str, quantize: bool = False) -> Optional[float]:
+    """Min cosine recorded for the export, or None if it was never checked"""
+    try:
+        with open(os.path.join(model_dir, PARITY_FILE)) as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        return None
+    return recorded.get(QUANTIZED_MODEL_FILE if quantize else MODEL_FILE)
+
+
+def record_parity(model_dir: str, min_cosine: float, quantize: bool = False):
+    """Save a parity result next to the export, so servers can start without the torch model"""
+    path = os.path.join(model_dir, PARITY_FILE)
+    try:
+        with open(path) as f:
+            recorded = json.load(f)
+    except (OSError, ValueError):
+        recorded = {}
+    recorded[QUANTIZED_MODEL_FILE if quantize else MODEL_FILE] = min_cosine
+    fd, tmp_path = tempfile.mkstemp(dir=model_dir, prefix=f".{PARITY_FILE}.")
+    with os.fdopen(fd, "w") as f:
+        json.dump(recorded, f)
+    os.replace(tmp_path, path)
+
+
+def export_checked(reference, model_dir: str, quantize: bool = False) -> float:
+    """Export, measure parity against the torch model and record it; returns the min cosine"""
+    export_model(reference, model_dir, quantize=quantize)
+    min_cosine = check_parity(reference, OnnxSentenceEncoder(model_dir, quantize=quantize))
+    record_parity(model_dir, min_cosine, quantize)
+    return min_cosine
+
+
+if __name__ == "__main__":
+    import argparse
+
+    from sentence_transformers import SentenceTransformer
+
+    logging.basicConfig(level=logging.INFO)
+
+    parser = argparse.ArgumentParser(description="Export a sentence-transformers model to ONNX")
+    parser.add_argument("model_name")
+    parser.add_argument("model_dir")
+    parser.add_argument("--quantize", action="store_true", help="Also write a dynamic int8 model")
+    parser.add_argument("--tolerance", type=float, default=0.01,
+                        help="Maximum allowed 1 - cosine similarity against the torch model")
+    args = parser.parse_args()
+
+    reference = SentenceTransformer(args.model_name, device="cpu")
+    min_cosine = export_checked(reference, args.model_dir, quantize=args.quantize)
+    logger.info("Parity: min cosine %.6f (tolerance %.4f)", min_cosine, args.tolerance)
+    if min_cosine < 1 - args.tolerance:
+        raise SystemExit("ONNX embeddings are outside the cosine tolerance of the torch model")
@@ -0,0 +1,91 @@
+"""
+Cross-encoder reranker for the embedding server.
+
+Scores (query, document) pairs with a small sentence-transformers
+CrossEncoder on CPU. The model is loaded on first use. Scoring runs in
+batches, in input order, and stops at the request's deadline, so callers
+get the scores that fit their time budget (the documents they ranked
+highest first) rather than a late answer.
+"""
+
+import asyncio
+import logging
+import time
+from typing import Any, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+
+class Reranker:
+    """Lazily loaded CrossEncoder scoring pairs in deadline-bounded batches"""
+
+    def __init__(self, model_name: str, batch_size: int = 16, max_length: int = 256, device: str = "cpu"):
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_length = max_length
+        self.device = device
+        self.model = None
+        self.load_time = 0.0
+        self._lock = asyncio.Lock()
+        self.requests = 0
+        self.truncated = 0
+
+    def _load(self):
+        from sentence_transformers import CrossEncoder
+
+        start = time.perf_counter()
+        model = CrossEncoder(self.model_name, max_length=self.max_length, device=self.device)
+        self.load_time = time.perf_counter() - start
+        logger.info("Loaded reranker %s in %.1fs", self.model_name, self.load_time)
+        return model
+
+    async def get(self):
+        """The loaded model, loading it (in a worker thread, once) if needed"""
+        if self.model is None:
+            async with self._lock:
+                if self.model is None:
+                    self.model = await asyncio.get_running_loop().run_in_executor(None, self._load)
+        return self.model
+
+    def score(self, query: str, documents: List[str], deadline: Optional[float] = None) -> List[Optional[float]]:
+        """Relevance score per document; None for documents not reached by the deadline (perf_counter)"""
+        scores: List[Optional[float]] = [None] * len(documents)
+        for start in range(0, len(documents), self.batch_size):
+            if deadline is not None and start and time.perf_counter() >= deadline:
+                break
+            batch = documents[start:start + self.batch_size]
+            batch_scores = self.model.predict(
+                [(query, document) for document in batch],
+                batch_size=len(batch),
+                show_progress_bar=False,
+                convert_to_numpy=True
+            )
+            scores[start:start + len(batch)] = [float(s) for s in batch_scores]
+        return scores
+
+    async def rerank(self, query: str, documents: List[str], budget: Optional[float] = None) -> List[Optional[float]]:
+        """Score documents off the event loop, within `budget` seconds if given"""
+        model_ready = self.model is not None
+        start = time.perf_counter()
+        await self.get()
+        # A first request that had to load the model still gets a full budget
+        deadline = None
+        if budget is not None:
+            deadline = (time.perf_counter() if not model_ready else start) + budget
+
+        scores = await asyncio.get_running_loop().run_in_executor(None, self.score, query, documents, deadline)
+        self.requests += 1
+        if any(s is None for s in scores):
+            self.truncated += 1
+        return scores
+
+    def stats(self) -> Dict[str, Any]:
+        return {
+            "model_name": self.model_name,
+            "loaded": self.model is not None,
+            "load_time": round(self.load_time, 3),
+            "batch_size": self.batch_size,
+            "max_length": self.max_length,
+            "requests": self.requests,
+            "truncated": self.truncated,
+        }
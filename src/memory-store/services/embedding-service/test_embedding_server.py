@@ -55,7 +55,8 @@ class TestEmbeddingServer(unittest.TestCase):
         data = response.json()
         
         # Verify response structure
-        required_fields = ['status', 'model_loaded', 'model_name', 'device', 'dimensions']
+        required_fields = ['status', 'model_loaded', 'model_name', 'device', 'dimensions', 'backend',
+                           'startup_timings']
         for field in required_fields:
             self.assertIn(field, data, f"Missing required field: {field}")
         
@@ -64,8 +65,11 @@ class TestEmbeddingServer(unittest.TestCase):
         self.assertTrue(data['model_loaded'])
         self.assertIsInstance(data['model_name'], str)
         self.assertIn(data['device'], ['cpu', 'cuda'])
+        self.assertIn(data['backend'], ['torch', 'onnx', 'onnx-int8'])
         self.assertIsInstance(data['dimensions'], int)
         self.assertGreater(data['dimensions'], 0)
+        for phase in ['imports', 'model_load', 'warmup', 'total']:
+            self.assertIn(phase, data['startup_timings'])
 
     def test_embeddings_endpoint_single_text(self):
         """Test embeddings generation with a single text."""
@@ -136,9 +140,10 @@ class TestEmbeddingServer(unittest.TestCase):
         self.assertIn("No texts provided", data['detail'])
 
     def test_embeddings_endpoint_too_many_texts_error(self):
-        """Test embeddings endpoint with too many texts (>100)."""
+        """Test embeddings endpoint with more texts than the advertised limit."""
+        limits = self.session.get(f"{self.BASE_URL}/limits").json()
         payload = {
-            "texts": [f"Text number {i}" for i in range(101)]
+            "texts": [f"Text number {i}" for i in range(limits['max_request_texts'] + 1)]
         }
         
         response = self.session.post(f"{self.BASE_URL}/embeddings", json=payload)
@@ -147,6 +152,48 @@ class TestEmbeddingServer(unittest.TestCase):
         data = response.json()
         self.assertIn("Too many texts", data['detail'])
 
+    def test_embeddings_endpoint_many_short_texts_accepted(self):
+        """Test more than 100 short texts fit within the token limit."""
+        payload = {
+            "texts": [f"Query {i}" for i in range(101)]
+        }
+        
+        response = self.session.post(f"{self.BASE_URL}/embeddings", json=payload)
+        
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(len(response.json()['embeddings']), 101)
+
+    def test_embeddings_endpoint_too_many_tokens_error(self):
+        """Test embeddings endpoint rejects requests over the token limit with 413."""
+        limits = self.session.get(f"{self.BASE_URL}/limits").json()
+        
+        # Each text is truncated to max_seq_length tokens, so this many just exceed the limit
+        count = limits['max_request_tokens'] // limits['max_seq_length'] + 1
+        if count > limits['max_request_texts']:
+            self.skipTest("Text count limit is reached before the token limit")
+        payload = {
+            "texts": [" ".join(["token"] * limits['max_seq_length'] * 2)] * count
+        }
+        
+        response = self.session.post(f"{self.BASE_URL}/embeddings", json=payload)
+        
+        self.assertEqual(response.status_code, 413)
+        self.assertIn("Request too large", response.json()['detail'])
+
+    def test_limits_endpoint(self):
+        """Test limits endpoint advertises request limits for client batching."""
+        response = self.session.get(f"{self.BASE_URL}/limits")
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        
+        required_fields = ['max_request_texts', 'max_request_tokens', 'tokens_per_second',
+                           'token_burst', 'available_tokens', 'max_seq_length']
+        for field in required_fields:
+            self.assertIn(field, data, f"Missing required field: {field}")
+        self.assertGreater(data['max_request_tokens'], 0)
+        self.assertGreater(data['max_seq_length'], 0)
+
     def test_embeddings_endpoint_invalid_json(self):
         """Test embeddings endpoint with invalid JSON."""
         response = self.session.post(
@@ -242,6 +289,113 @@ class TestEmbeddingServer(unittest.TestCase):
                 self.assertIn(field, model_info)
                 self.assertIsInstance(model_info[field], str)
 
+    def test_models_endpoint_reports_loaded_models(self):
+        """Test models endpoint reports load time and memory of loaded models."""
+        response = self.session.get(f"{self.BASE_URL}/models")
+        
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        
+        self.assertIn(data['default_model'], data['allowed_models'])
+        loaded = {model['name']: model for model in data['loaded_models']}
+        self.assertIn(data['default_model'], loaded)
+        
+        default = loaded[data['default_model']]
+        for field in ['load_time', 'memory_mb', 'rss_delta_mb', 'requests', 'idle_seconds']:
+            self.assertIn(field, default)
+        self.assertGreater(default['load_time'], 0)
+        self.assertGreater(default['memory_mb'], 0)
+
+    def test_embeddings_endpoint_unknown_model_error(self):
+        """Test embeddings endpoint rejects models outside the allowed list."""
+        payload = {
+            "texts": ["Hello world"],
+            "model_name": "not-a-real-model"
+        }
+        
+        response = self.session.post(f"{self.BASE_URL}/embeddings", json=payload)
+        
+        self.assertEqual(response.status_code, 400)
+        data = response.json()
+        self.assertIn("Unknown model", data['detail'])
+
+    def test_tokenize_endpoint(self):
+        """Test tokenize endpoint returns per-text token counts and model limit."""
+        payload = {
+            "texts": ["Hello world", "", "A longer sentence with quite a few more tokens in it"]
+        }
+
+        response = self.session.post(f"{self.BASE_URL}/tokenize", json=payload)
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+
+        required_fields = ['token_counts', 'model_name', 'max_seq_length']
+        for field in required_fields:
+            self.assertIn(field, data, f"Missing required field: {field}")
+
+        counts = data['token_counts']
+        self.assertEqual(len(counts), 3)
+        self.assertEqual(counts[1], 0)
+        self.assertGreater(counts[2], counts[0])
+        self.assertGreater(data['max_seq_length'], 0)
+
+    def test_tokenize_endpoint_counts_past_model_limit(self):
+        """Test token counts are not truncated at the model's max sequence length."""
+        long_text = "token " * 2000
+
+        response = self.session.post(f"{self.BASE_URL}/tokenize", json={"texts": [long_text]})
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertGreater(data['token_counts'][0], data['max_seq_length'])
+
+    def test_rerank_endpoint(self):
+        """Test rerank endpoint scores every document against the query."""
+        payload = {
+            "query": "How do I configure the database connection?",
+            "documents": [
+                "Set DATABASE_URL to point the service at Postgres.",
+                "The weather is sunny today.",
+                "Connection pooling is configured with DB_POOL_SIZE."
+            ]
+        }
+
+        response = self.session.post(f"{self.BASE_URL}/rerank", json=payload)
+        if response.status_code == 503:
+            self.skipTest("Reranker model is not available")
+
+        self.assertEqual(response.status_code, 200)
+        data = response.json()
+        self.assertEqual(len(data['scores']), 3)
+        self.assertTrue(data['complete'])
+        self.assertTrue(all(isinstance(score, float) for score in data['scores']))
+
+    def test_metrics_endpoint(self):
+        """Test Prometheus metrics include request latency and encode batches."""
+        self.session.post(f"{self.BASE_URL}/embeddings", json={"texts": ["metrics sample text"]})
+
+        response = self.session.get(f"{self.BASE_URL}/metrics")
+
+        self.assertEqual(response.status_code, 200)
+        self.assertIn("text/plain", response.headers['content-type'])
+        self.assertIn('embedding_http_request_seconds_count{endpoint="/embeddings",method="POST"}', response.text)
+        self.assertIn("embedding_encode_batch_texts_bucket", response.text)
+        self.assertIn("embedding_cache_lookups_total", response.text)
+
+    def test_rerank_endpoint_too_many_documents_error(self):
+        """Test rerank endpoint rejects more documents than the advertised limit."""
+        limits = self.session.get(f"{self.BASE_URL}/limits").json()
+        payload = {
+            "query": "test",
+            "documents": [f"Document {i}" for i in range(limits['max_rerank_documents'] + 1)]
+        }
+
+        response = self.session.post(f"{self.BASE_URL}/rerank", json=payload)
+
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("Too many documents", response.json()['detail'])
+
     def test_embeddings_consistency(self):
         """Test that same input produces consistent embeddings."""
         payload = {
@@ -260,6 +414,46 @@ class TestEmbeddingServer(unittest.TestCase):
         for response in responses[1:]:
             self.assertEqual(response['embeddings'][0], first_embedding)
 
+    def test_embeddings_mixed_lengths_keep_input_order(self):
+        """Test length-bucketed encoding returns embeddings in request order."""
+        texts = [
+            "kubernetes deployment " * 100,
+            "short query",
+            "ansible playbook for the cluster " * 20,
+            "memory store",
+        ]
+
+        batch_response = self.session.post(f"{self.BASE_URL}/embeddings", json={"texts": texts})
+        self.assertEqual(batch_response.status_code, 200)
+        batch_embeddings = batch_response.json()['embeddings']
+
+        for text, batch_embedding in zip(texts, batch_embeddings):
+            response = self.session.post(f"{self.BASE_URL}/embeddings", json={"texts": [text]})
+            self.assertEqual(response.status_code, 200)
+            single_embedding = response.json()['embeddings'][0]
+
+            cosine = sum(a * b for a, b in zip(single_embedding, batch_embedding))
+            self.assertAlmostEqual(cosine, 1.0, places=4)
+
+    def test_embeddings_repeated_texts_served_from_cache(self):
+        """Test repeated texts are served from the embedding cache with identical embeddings."""
+        health = self.session.get(f"{self.BASE_URL}/health").json()
+        if not health.get('cache'):
+            self.skipTest("Embedding cache is disabled")
+        
+        texts = [f"Cache test {time.time()} text {i}" for i in range(5)]
+        first = self.session.post(f"{self.BASE_URL}/embeddings", json={"texts": texts})
+        second = self.session.post(f"{self.BASE_URL}/embeddings", json={"texts": texts[::-1]})
+        
+        self.assertEqual(first.status_code, 200)
+        self.assertEqual(second.status_code, 200)
+        self.assertEqual(first.json()['cache_hits'], 0)
+        self.assertEqual(second.json()['cache_hits'], len(texts))
+        
+        for original, cached in zip(first.json()['embeddings'], second.json()['embeddings'][::-1]):
+            for a, b in zip(original, cached):
+                self.assertAlmostEqual(a, b, places=6)
+
     def test_embeddings_normalization(self):
         """Test that embeddings are normalized (L2 norm ≈ 1)."""
         payload = {
@@ -365,7 +559,7 @@ class TestEmbeddingServerStress(unittest.TestCase):
         cls.session.close()
 
     def test_maximum_batch_size(self):
-        """Test with maximum allowed batch size (100 texts)."""
+        """Test with a large batch (100 texts)."""
         payload = {
             "texts": [f"Batch test text number {i}" for i in range(100)]
         }
@@ -0,0 +1,264 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the markdown chunker.
+
+Compares markdown_chunker.iter_chunks against the previous implementation
+(a markdown.Markdown object per document, re.match per line and line-list
+overlap), on a synthetic corpus or on a directory of real markdown files.
+With --report, prints the chunk size distribution and duplication ratio
+for a sweep of overlap settings instead, to tune chunking for cost.
+
+    python bench_chunking.py --files 2000
+    python bench_chunking.py --docs-path /app/docs --repeat 5
+    python bench_chunking.py --docs-path /app/docs --report --overlaps 0,50,100
+"""
+
+import argparse
+import random
+import re
+import time
+import tracemalloc
+from pathlib import Path
+from typing import Any, Dict, List
+
+import markdown
+
+from markdown_chunker import iter_chunks, parse_front_matter, summarize_chunks
+
+WORDS = (
+    "cluster node deploy ansible kubernetes service memory vector index query "
+    "embedding chunk search worker pod helm chart volume config secret network "
+    "latency throughput cache batch model token schema postgres replica"
+).split()
+
+
+def _sentence(rng: random.Random, min_words: int = 6, max_words: int = 18) -> str:
+    words = rng.choices(WORDS, k=rng.randint(min_words, max_words))
+    return " ".join(words).capitalize() + "."
+
+
+def generate_document(rng: random.Random, sections: int = 12, code_ratio: float = 0.15,
+                      table_ratio: float = 0.1, max_level: int = 4, paragraph_sentences: int = 6) -> str:
+    """
+    Generate a markdown document with headers, code blocks, tables and lists.
+
+    code_ratio and table_ratio are the fractions of section blocks that are
+    fenced code and tables (the blocks the chunker never splits), max_level
+    the deepest header level, and paragraph_sentences the longest paragraph.
+    """
+    lines = []
+    if rng.random() < 0.3:
+        lines += ["---", f"title: {_sentence(rng, 2, 5)}", "tags: [bench, synthetic]",
+                  "date: 2024-01-01", "---", ""]
+
+    lines.append(f"# {_sentence(rng, 2, 6)}")
+    lines.append("")
+    for _ in range(sections):
+        level = rng.randint(2, max_level)
+        lines.append(f"{'#' * level} {_sentence(rng, 2, 6)}")
+        lines.append("")
+        for _ in range(rng.randint(1, 6)):
+            kind = rng.random()
+            if kind < code_ratio:
+                lines.append("```bash")
+                for _ in range(rng.randint(3, 15)):
+                    lines.append(f"# {_sentence(rng, 2, 5)}" if rng.random() < 0.2
+                                 else f"kubectl get {rng.choice(WORDS)} -n {rng.choice(WORDS)}")
+                lines.append("```")
+            elif kind < code_ratio + table_ratio:
+                lines.append("| Name | Value | Notes |")
+                lines.append("|------|-------|-------|")
+                for _ in range(rng.randint(2, 10)):
+                    lines.append(f"| {rng.choice(WORDS)} | {rng.randint(0, 999)} | {_sentence(rng, 2, 6)} |")
+            elif kind < code_ratio + table_ratio + 0.15:
+                for _ in range(rng.randint(2, 8)):
+                    lines.append(f"- {_sentence(rng, 3, 10)}")
+            else:
+                lines.append(" ".join(_sentence(rng) for _ in range(rng.randint(1, paragraph_sentences))))
+            lines.append("")
+    return "\n".join(lines)
+
+
+def generate_corpus(files: int, seed: int = 42, sections: int = 12, **shape) -> List[str]:
+    """Generate a reproducible synthetic markdown corpus; shape is passed to generate_document"""
+    rng = random.Random(seed)
+    return [generate_document(rng, rng.randint(sections // 2, sections * 2), **shape) for _ in range(files)]
+
+
+def legacy_chunk_markdown(content: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """The chunker as it was before markdown_chunker, kept as the baseline"""
+    md = markdown.Markdown(extensions=['meta', 'toc', 'fenced_code', 'tables'])
+    metadata = getattr(md, 'Meta', {})
+
+    sections = []
+    current_section = []
+    current_header = ""
+    current_level = 0
+    for line in content.split('\n'):
+        header_match = re.match(r'^(#{1,6})\s+(.+)', line.strip())
+        if header_match:
+            if current_section:
+                sections.append({
+                    'content': '\n'.join(current_section),
+                    'header': current_header,
+                    'level': current_level,
+                    'size': sum(len(l) + 1 for l in current_section)
+                })
+            current_level = len(header_match.group(1))
+            current_header = header_match.group(2).strip()
+            current_section = [line]
+        else:
+            current_section.append(line)
+    if current_section:
+        sections.append({
+            'content': '\n'.join(current_section),
+            'header': current_header,
+            'level': current_level,
+            'size': sum(len(l) + 1 for l in current_section)
+        })
+
+    chunks = []
+    for section in sections:
+        if section['size'] <= chunk_size:
+            chunks.append({'content': section['content'].strip(),
+                           'metadata': {'header': section['header'], 'size': section['size']}})
+            continue
+
+        current_chunk = []
+        current_size = 0
+        in_code_block = False
+        in_table = False
+        code_fence_pattern = re.compile(r'^```')
+        table_pattern = re.compile(r'^\|.*\|$')
+        for line in section['content'].split('\n'):
+            line_stripped = line.strip()
+            if code_fence_pattern.match(line_stripped):
+                in_code_block = not in_code_block
+            if table_pattern.match(line_stripped):
+                in_table = True
+            elif in_table and not line_stripped:
+                in_table = False
+            current_chunk.append(line)
+            current_size += len(line) + 1
+            if (current_size > chunk_size and not in_code_block and
+                    not in_table and line_stripped == ''):
+                chunks.append({'content': '\n'.join(current_chunk).strip(),
+                               'metadata': {'header': section['header'], 'size': current_size}})
+                overlap_lines = current_chunk[-chunk_overlap:] if len(current_chunk) > chunk_overlap else []
+                current_chunk = overlap_lines
+                current_size = sum(len(l) + 1 for l in overlap_lines)
+        if current_chunk:
+            chunks.append({'content': '\n'.join(current_chunk).strip(),
+                           'metadata': {'header': section['header'], 'size': current_size}})
+
+    for chunk in chunks:
+        chunk['metadata']['document_metadata'] = metadata
+    return chunks
+
+
+def single_pass_chunk_markdown(content: str, chunk_size: int, chunk_overlap: int) -> List[Dict[str, Any]]:
+    """The current chunker, as DocumentProcessor.chunk_markdown drives it"""
+    metadata, body_start = parse_front_matter(content)
+    chunks = list(iter_chunks(content, chunk_size, chunk_overlap, start=body_start))
+    for chunk in chunks:
+        chunk['metadata']['document_metadata'] = metadata
+    return chunks
+
+
+def run(name: str, chunker, corpus: List[str], chunk_size: int, chunk_overlap: int,
+        repeat: int, trace_memory: bool) -> Dict[str, Any]:
+    """Time a chunker over the corpus, keeping the best of `repeat` runs"""
+    best = float('inf')
+    chunk_count = 0
+    for _ in range(repeat):
+        start = time.perf_counter()
+        chunk_count = 0
+        for content in corpus:
+            chunk_count += len(chunker(content, chunk_size, chunk_overlap))
+        best = min(best, time.perf_counter() - start)
+
+    peak = None
+    if trace_memory:
+        tracemalloc.start()
+        for content in corpus:
+            chunker(content, chunk_size, chunk_overlap)
+        peak = tracemalloc.get_traced_memory()[1]
+        tracemalloc.stop()
+
+    return {'name': name, 'seconds': best, 'chunks': chunk_count, 'peak_bytes': peak}
+
+
+def report(corpus: List[str], chunk_size: int, overlaps: List[int], legacy_overlap: int):
+    """Print chunk counts, size distribution and duplication per overlap setting"""
+    source_size = sum(len(content) for content in corpus)
+
+    legacy_chunks = [chunk for content in corpus
+                     for chunk in legacy_chunk_markdown(content, chunk_size, legacy_overlap)]
+    legacy_size = sum(len(chunk['content']) for chunk in legacy_chunks)
+    print(f"{'legacy':>12}: {len(legacy_chunks)} chunks, {legacy_overlap}-line overlap, "
+          f"expansion {legacy_size / source_size:.2f}x")
+
+    for overlap in overlaps:
+        chunks = [chunk for content in corpus
+                  for chunk in single_pass_chunk_markdown(content, chunk_size, overlap)]
+        summary = summarize_chunks(
+            [chunk['metadata']['size'] for chunk in chunks],
+            [chunk['metadata']['overlap'] for chunk in chunks],
+            source_size
+        )
+        print(f"{'overlap ' + str(overlap):>12}: {summary['chunks']} chunks, "
+              f"duplication {summary['duplication_ratio']:.1%}, expansion {summary['expansion']:.2f}x, "
+              f"size min/p50/p90/p99/max {summary['size_min']}/{summary['size_p50']}/"
+              f"{summary['size_p90']}/{summary['size_p99']}/{summary['size_max']}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Markdown chunker microbenchmark')
+    parser.add_argument('--files', type=int, default=1000, help='Synthetic documents to generate')
+    parser.add_argument('--sections', type=int, default=12, help='Average sections per synthetic document')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--docs-path', help='Benchmark real markdown files instead of a synthetic corpus')
+    parser.add_argument('--chunk-size', type=int, default=512)
+    parser.add_argument('--chunk-overlap', type=int, default=50,
+                        help='Overlap in characters (lines for the legacy chunker)')
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--trace-memory', action='store_true', help='Also report peak traced allocations')
+    parser.add_argument('--report', action='store_true',
+                        help='Report size distribution and duplication instead of timing')
+    parser.add_argument('--overlaps', default='0,25,50,100',
+                        help='Comma-separated overlap sizes (characters) for --report')
+    args = parser.parse_args()
+
+    if args.docs_path:
+        corpus = [p.read_text(encoding='utf-8') for p in sorted(Path(args.docs_path).rglob("*.md"))]
+    else:
+        corpus = generate_corpus(args.files, args.seed, args.sections)
+
+    total_mb = sum(len(c) for c in corpus) / 1e6
+    print(f"Corpus: {len(corpus)} documents, {total_mb:.1f} MB")
+
+    if args.report:
+        overlaps = [int(overlap) for overlap in args.overlaps.split(',')]
+        report(corpus, args.chunk_size, overlaps, args.chunk_overlap)
+        return
+
+    results = [
+        run('legacy', legacy_chunk_markdown, corpus, args.chunk_size, args.chunk_overlap,
+            args.repeat, args.trace_memory),
+        run('single-pass', single_pass_chunk_markdown, corpus, args.chunk_size, args.chunk_overlap,
+            args.repeat, args.trace_memory),
+    ]
+
+    for result in results:
+        line = (f"{result['name']:>12}: {result['seconds']:.3f}s "
+                f"({total_mb / result['seconds']:.1f} MB/s, {len(corpus) / result['seconds']:.0f} docs/s), "
+                f"{result['chunks']} chunks")
+        if result['peak_bytes'] is not None:
+            line += f", peak {result['peak_bytes'] / 1e6:.1f} MB allocated"
+        print(line)
+
+    print(f"Speedup: {results[0]['seconds'] / results[1]['seconds']:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -2,12 +2,12 @@ import os
 import json
 import time
 import hashlib
+import math
 from pathlib import Path
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Callable
 import psycopg2
-from psycopg2.extras import RealDictCursor
+from psycopg2.extras import RealDictCursor, execute_values
 import requests
-import markdown
 from watchdog.observers import Observer
 from watchdog.events import FileSystemEventHandler
 import logging
@@ -17,6 +17,10 @@ import threading
 from http.server import HTTPServer, BaseHTTPRequestHandler
 import socketserver
 
+import metrics
+from markdown_chunker import iter_chunks, parse_front_matter
+from snapshot import write_snapshot
+
 # Configure logging
 logging.basicConfig(
     level=logging.INFO,
@@ -38,6 +42,8 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
             self.send_health_response()
         elif self.path == '/stats':
             self.send_stats_response()
+        elif self.path == '/metrics':
+            self.send_metrics_response()
         elif self.path == '/process':
             self.trigger_processing()
         else:
@@ -134,6 +140,14 @@ class HealthCheckHandler(BaseHTTPRequestHandler):
             self.end_headers()
             self.wfile.write(json.dumps(error_data).encode())
     
+    def send_metrics_response(self):
+        """Send Prometheus metrics"""
+        body = metrics.render()
+        self.send_response(200)
+        self.send_header('Content-type', metrics.CONTENT_TYPE_LATEST)
+        self.end_headers()
+        self.wfile.write(body)
+    
     def trigger_processing(self):
         """Trigger document processing"""
         try:
@@ -193,6 +207,7 @@ class HealthCheckServer:
             logger.info(f"Health endpoint: http://localhost:{self.port}/health")
             logger.info(f"Stats endpoint: http://localhost:{self.port}/stats")
             logger.info(f"Process endpoint: http://localhost:{self.port}/process")
+            logger.info(f"Metrics endpoint: http://localhost:{self.port}/metrics")
             
         except Exception as e:
             logger.error(f"Failed to start health check server: {e}")
@@ -205,54 +220,216 @@ class HealthCheckServer:
             logger.info("Health check server stopped")
 
 
+class EmbeddingRequestTooLarge(Exception):
+    """The embedding service rejected a request as over its token limit (413)"""
+
+
+class EmbeddingRateLimited(Exception):
+    """The embedding service kept rate limiting a request (429) past the wait limit"""
+
+
+class EmbeddingTokenizer:
+    """Counts model tokens using the embedding service's /tokenize endpoint"""
+    
+    # [CLS] and [SEP] are added to every sequence by the model
+    SPECIAL_TOKENS = 2
+    
+    def __init__(self, embeddings_url: str, model_name: str, batch_size: int = 1000):
+        self.embeddings_url = embeddings_url
+        self.model_name = model_name
+        self.batch_size = batch_size
+        self.max_seq_length = None
+    
+    def count_tokens(self, texts: List[str]) -> List[int]:
+        """Count tokens for each text, in batches"""
+        counts = []
+        for i in range(0, max(len(texts), 1), self.batch_size):
+            payload = {
+                "texts": texts[i:i + self.batch_size],
+                "model_name": self.model_name,
+            }
+            response = requests.post(f"{self.embeddings_url}/tokenize", json=payload, timeout=30)
+            response.raise_for_status()
+            
+            data = response.json()
+            self.max_seq_length = data["max_seq_length"]
+            counts.extend(data["token_counts"])
+        
+        return counts
+    
+    def token_budget(self) -> int:
+        """Largest chunk, in tokens, the model embeds without truncation"""
+        if self.max_seq_length is None:
+            self.count_tokens([])
+        return self.max_seq_length - self.SPECIAL_TOKENS
+    
+    def line_measure(self, content: str) -> Callable[[str], int]:
+        """Tokenize each distinct line of content once and return a per-line counter"""
+        lines = list(dict.fromkeys(content.split('\n')))
+        counts = dict(zip(lines, self.count_tokens(lines)))
+        
+        def measure(line: str) -> int:
+            line = line.rstrip('\n')
+            if line not in counts:
+                counts[line] = self.count_tokens([line])[0]
+            return counts[line]
+        
+        return measure
+
+
 class DocumentProcessor:
     def __init__(self, db_url: str, embeddings_url: str, docs_path: str):
         self.db_url = db_url
         self.embeddings_url = embeddings_url
         self.docs_path = Path(docs_path)
+        self.embedding_model = os.getenv("EMBEDDING_MODEL", "all-MiniLM-L6-v2")
+        # CHUNK_UNIT=tokens sizes chunks in model tokens, packed up to the
+        # model's max sequence length (or CHUNK_MAX_TOKENS, if lower)
+        self.chunk_unit = os.getenv("CHUNK_UNIT", "chars")
         self.chunk_size = int(os.getenv("CHUNK_SIZE", "512"))
+        self.chunk_max_tokens = int(os.getenv("CHUNK_MAX_TOKENS", "0"))
+        # Overlap is in the same unit as the chunk size, capped by the chunker
         self.chunk_overlap = int(os.getenv("CHUNK_OVERLAP", "50"))
-        self.batch_size = int(os.getenv("BATCH_SIZE", "10"))
+        # Chunks embedded and inserted together; embedding requests within a
+        # batch are packed to the embedding service's advertised limits
+        self.batch_size = int(os.getenv("BATCH_SIZE", "100"))
+        # Longest a request keeps retrying while the service rate limits it
+        self.rate_limit_timeout = float(os.getenv("EMBEDDING_RATE_LIMIT_TIMEOUT", "300"))
+        self.tokenizer = EmbeddingTokenizer(embeddings_url, self.embedding_model)
+        self.embedding_limits = None
+        # VECTOR_METRIC=ip ranks by inner product, which equals cosine
+        # similarity only for unit vectors, so embeddings are normalized
+        # before storage
+        self.vector_metric = os.getenv("VECTOR_METRIC", "cosine")
+        # Publish an embedding snapshot for the search API workers to mmap
+        # after each ingest run, and at most every EMBEDDING_SNAPSHOT_INTERVAL
+        # seconds while watching for changes
+        self.snapshot_path = os.getenv("EMBEDDING_SNAPSHOT_PATH", "")
+        self.snapshot_dtype = os.getenv("EMBEDDING_SNAPSHOT_DTYPE", "float32")
+        self.snapshot_interval = float(os.getenv("EMBEDDING_SNAPSHOT_INTERVAL", "60"))
+        self.snapshot_stale = False
+        self.snapshot_published_at = 0.0
+        self.snapshot_lock = threading.Lock()
         
         self.conn = psycopg2.connect(db_url)
         self.conn.autocommit = True
     
     def generate_embedding(self, text: str) -> List[float]:
         """Generate embedding using with retry logic"""
-        
+        return self.generate_embeddings([text])[0]
+    
+    def generate_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """
+        Generate embeddings for texts in as few requests as the embedding
+        service admits.
+        
+        Requests are packed up to the service's advertised text and token
+        limits, using a conservative token estimate. A 413 halves the
+        request size for the rest of the call, and a 429 waits for
+        Retry-After.
+        """
         # Clean and truncate text if necessary
-        cleaned_text = self._clean_text_for_embedding(text)
-
+        cleaned_texts = [self._clean_text_for_embedding(text) for text in texts]
+        
+        limits = self._get_embedding_limits()
+        max_texts = limits.get("max_request_texts") or 100
+        max_tokens = limits.get("max_request_tokens")
+        
+        embeddings = []
+        start = 0
+        while start < len(cleaned_texts):
+            end = start
+            tokens = 0
+            while end < len(cleaned_texts) and end - start < max_texts:
+                text_tokens = self._estimate_tokens(cleaned_texts[end], limits.get("max_seq_length"))
+                if max_tokens and end > start and tokens + text_tokens > max_tokens:
+                    break
+                tokens += text_tokens
+                end += 1
+            
+            try:
+                embeddings.extend(self._request_embeddings(cleaned_texts[start:end]))
+                start = end
+            except EmbeddingRequestTooLarge as e:
+                if end - start == 1:
+                    raise
+                max_texts = (end - start) // 2
+                logger.warning(f"{e}; retrying with at most {max_texts} texts per request")
+        
+        return embeddings
+    
+    def _get_embedding_limits(self) -> Dict[str, Any]:
+        """Request limits advertised by the embedding service, read once"""
+        if self.embedding_limits is None:
+            try:
+                response = requests.get(f"{self.embeddings_url}/limits", timeout=10)
+                response.raise_for_status()
+                self.embedding_limits = response.json()
+                logger.info(f"Embedding service limits: {self.embedding_limits}")
+            except requests.exceptions.RequestException as e:
+                # Older services only limit the text count
+                logger.warning(f"Could not read embedding service limits, assuming 100 texts per request: {e}")
+                return {"max_request_texts": 100}
+        return self.embedding_limits
+    
+    @staticmethod
+    def _estimate_tokens(text: str, max_seq_length: Optional[int]) -> int:
+        """Upper-bound token estimate; the service counts at most max_seq_length per text"""
+        # English averages ~4 characters per token; assume 2 so code and
+        # identifiers rarely exceed the estimate
+        tokens = len(text) // 2 + EmbeddingTokenizer.SPECIAL_TOKENS
+        return min(tokens, max_seq_length) if max_seq_length else tokens
+    
+    def _request_embeddings(self, texts: List[str]) -> List[List[float]]:
+        """POST one /embeddings request, with retries"""
         payload = {
-            "texts": [cleaned_text],
-            "model_name": "all-MiniLM-L6-v2", 
+            "texts": texts,
+            "model_name": self.embedding_model,
         }
         
         max_retries = 3
-        for attempt in range(max_retries):
+        attempt = 0
+        rate_limit_deadline = time.monotonic() + self.rate_limit_timeout
+        while True:
             try:
-                response = requests.post(f"{self.embeddings_url}/embeddings", json=payload, timeout=30)
+                with metrics.EMBEDDING_REQUEST_SECONDS.time():
+                    response = requests.post(f"{self.embeddings_url}/embeddings", json=payload, timeout=60)
+                metrics.EMBEDDING_REQUEST_TEXTS.observe(len(texts))
+                
+                if response.status_code == 429:
+                    wait_time = float(response.headers.get("Retry-After", "1"))
+                    if time.monotonic() + wait_time > rate_limit_deadline:
+                        raise EmbeddingRateLimited(
+                            f"Embedding service still rate limiting after {self.rate_limit_timeout:.0f}s")
+                    metrics.EMBEDDING_RETRIES.labels("rate_limited").inc()
+                    logger.info(f"Embedding service is rate limiting, retrying in {wait_time:.0f}s")
+                    time.sleep(wait_time)
+                    continue
+                if response.status_code == 413:
+                    raise EmbeddingRequestTooLarge(response.json().get("detail", "Request too large"))
                 response.raise_for_status()
                 
                 data = response.json()
-
-                if not data.get("embeddings") or len(data["embeddings"]) == 0:
-                    raise Exception("No embeddings returned from API")
                 
-                embedding = data["embeddings"][0]
+                if len(data.get("embeddings") or []) != len(texts):
+                    raise Exception(f"Expected {len(texts)} embeddings, got {len(data.get('embeddings') or [])}")
                 
-                logger.info(f"Generated embedding with {data['dimensions']} dimensions")
+                logger.info(f"Generated {len(texts)} embeddings with {data['dimensions']} dimensions")
                 
-                return embedding
+                return data["embeddings"]
                 
             except requests.exceptions.RequestException as e:
-                if attempt < max_retries - 1:
-                    wait_time = 2 ** attempt  # Exponential backoff
-                    logger.warning(f"API request failed (attempt {attempt + 1}), retrying in {wait_time}s: {e}")
+                attempt += 1
+                if attempt < max_retries:
+                    metrics.EMBEDDING_RETRIES.labels("error").inc()
+                    wait_time = 2 ** (attempt - 1)  # Exponential backoff
+                    logger.warning(f"API request failed (attempt {attempt}), retrying in {wait_time}s: {e}")
                     time.sleep(wait_time)
                 else:
-                    logger.error(f"Error calling Voyage AI API after {max_retries} attempts: {e}")
+                    logger.error(f"Error calling embedding service after {max_retries} attempts: {e}")
                     raise
+            except (EmbeddingRequestTooLarge, EmbeddingRateLimited):
+                raise
             except Exception as e:
                 logger.error(f"Error processing embedding response: {e}")
                 raise
@@ -269,152 +446,48 @@ class DocumentProcessor:
         
         return text
     
-    def chunk_markdown(self, content: str, file_path: str) -> List[Dict[str, Any]]:
+    def chunk_markdown(self, content: str, file_path: str, title: str = '') -> List[Dict[str, Any]]:
         """Intelligently chunk markdown content preserving structure"""
-        # Parse markdown to extract structure
-        md = markdown.Markdown(extensions=['meta', 'toc', 'fenced_code', 'tables'])
-        
-        # Extract metadata if available
-        metadata = getattr(md, 'Meta', {})
-        
-        # Split content into logical sections
-        sections = self._split_by_headers(content)
-        
-        # Further chunk large sections while preserving code blocks and tables
-        chunks = []
-        for section in sections:
-            section_chunks = self._chunk_section(section, file_path)
-            chunks.extend(section_chunks)
+        # Extract YAML front-matter; chunking starts after it
+        metadata, body_start = parse_front_matter(content)
+        
+        # Size chunks in characters, or in model tokens packed up to the limit
+        chunk_size = self.chunk_size
+        max_size = None
+        measure = None
+        if self.chunk_unit == 'tokens':
+            chunk_size = max_size = self._token_chunk_size()
+            measure = self.tokenizer.line_measure(content[body_start:])
+        
+        # Split into sections and size-bounded chunks in a single pass,
+        # preserving code blocks and tables
+        chunks = list(iter_chunks(
+            content, chunk_size, self.chunk_overlap, start=body_start,
+            measure=measure, max_size=max_size
+        ))
         
         # Add global metadata to all chunks
+        processed_at = datetime.now().isoformat()
         for i, chunk in enumerate(chunks):
             chunk['metadata'].update({
                 'file_path': str(file_path),
+                # Weighted into content_tsvector, so title matches rank highest
+                'title': title,
                 'chunk_index': i,
                 'total_chunks': len(chunks),
                 'document_metadata': metadata,
-                'processed_at': datetime.now().isoformat()
+                'size_unit': self.chunk_unit,
+                'processed_at': processed_at
             })
         
         return chunks
     
-    def _split_by_headers(self, content: str) -> List[Dict[str, Any]]:
-        """Split content by markdown headers"""
-        sections = []
-        lines = content.split('\n')
-        current_section = []
-        current_header = ""
-        current_level = 0
-        
-        for line in lines:
-            line_stripped = line.strip()
-            
-            # Check for header
-            header_match = re.match(r'^(#{1,6})\s+(.+)', line_stripped)
-            if header_match:
-                # Save previous section if it exists
-                if current_section:
-                    sections.append({
-                        'content': '\n'.join(current_section),
-                        'header': current_header,
-                        'level': current_level,
-                        'size': sum(len(l) + 1 for l in current_section)
-                    })
-                
-                # Start new section
-                current_level = len(header_match.group(1))
-                current_header = header_match.group(2).strip()
-                current_section = [line]
-            else:
-                current_section.append(line)
-        
-        # Add final section
-        if current_section:
-            sections.append({
-                'content': '\n'.join(current_section),
-                'header': current_header,
-                'level': current_level,
-                'size': sum(len(l) + 1 for l in current_section)
-            })
-        
-        return sections
-    
-    def _chunk_section(self, section: Dict[str, Any], file_path: str) -> List[Dict[str, Any]]:
-        """Chunk a section while preserving code blocks and tables"""
-        content = section['content']
-        
-        # If section is small enough, return as single chunk
-        if section['size'] <= self.chunk_size:
-            return [{
-                'content': content.strip(),
-                'metadata': {
-                    'header': section['header'],
-                    'header_level': section['level'],
-                    'size': section['size'],
-                    'chunk_type': 'complete_section'
-                }
-            }]
-        
-        # Split large sections intelligently
-        chunks = []
-        lines = content.split('\n')
-        current_chunk = []
-        current_size = 0
-        in_code_block = False
-        in_table = False
-        code_fence_pattern = re.compile(r'^```')
-        table_pattern = re.compile(r'^\|.*\|$')
-        
-        for line in lines:
-            line_stripped = line.strip()
-            
-            # Track code blocks
-            if code_fence_pattern.match(line_stripped):
-                in_code_block = not in_code_block
-            
-            # Track tables
-            if table_pattern.match(line_stripped):
-                in_table = True
-            elif in_table and not line_stripped:
-                in_table = False
-            
-            current_chunk.append(line)
-            current_size += len(line) + 1
-            
-            # Check if we should split (but not in code blocks or tables)
-            if (current_size > self.chunk_size and 
-                not in_code_block and 
-                not in_table and
-                line_stripped == ''):  # Split on empty lines
-                
-                chunks.append({
-                    'content': '\n'.join(current_chunk).strip(),
-                    'metadata': {
-                        'header': section['header'],
-                        'header_level': section['level'],
-                        'size': current_size,
-                        'chunk_type': 'section_part'
-                    }
-                })
-                
-                # Start new chunk with overlap
-                overlap_lines = current_chunk[-self.chunk_overlap:] if len(current_chunk) > self.chunk_overlap else []
-                current_chunk = overlap_lines
-                current_size = sum(len(l) + 1 for l in overlap_lines)
-        
-        # Add final chunk
-        if current_chunk:
-            chunks.append({
-                'content': '\n'.join(current_chunk).strip(),
-                'metadata': {
-                    'header': section['header'],
-                    'header_level': section['level'],
-                    'size': current_size,
-                    'chunk_type': 'section_part'
-                }
-            })
-        
-        return chunks
+    def _token_chunk_size(self) -> int:
+        """Token budget per chunk: the model limit, optionally capped lower"""
+        budget = self.tokenizer.token_budget()
+        if self.chunk_max_tokens:
+            budget = min(budget, self.chunk_max_tokens)
+        return budget
     
     def get_file_hash(self, file_path: Path) -> str:
         """Get MD5 hash of file content"""
@@ -440,10 +513,12 @@ class DocumentProcessor:
     
     def process_document(self, file_path: Path) -> bool:
         """Process a single markdown document"""
+        start = time.perf_counter()
         try:
             # Check if file needs processing
             if self.is_file_processed(file_path):
                 logger.info(f"File {file_path} is up to date, skipping")
+                metrics.DOCUMENTS.labels("skipped").inc()
                 return True
             
             logger.info(f"Processing document: {file_path}")
@@ -454,6 +529,7 @@ class DocumentProcessor:
             
             if not content.strip():
                 logger.warning(f"Empty file: {file_path}")
+                metrics.DOCUMENTS.labels("empty").inc()
                 return False
             
             # Extract title from first header or filename
@@ -469,7 +545,7 @@ class DocumentProcessor:
             }
             
             # Insert/update document
-            with self.conn.cursor() as cur:
+            with self.conn.cursor() as cur, metrics.DB_SECONDS.labels("upsert_document").time():
                 cur.execute("""
                     INSERT INTO documents (file_path, title, content, metadata)
                     VALUES (%s, %s, %s, %s)
@@ -484,11 +560,11 @@ class DocumentProcessor:
                 document_id = cur.fetchone()[0]
             
             # Delete existing chunks for this document
-            with self.conn.cursor() as cur:
+            with self.conn.cursor() as cur, metrics.DB_SECONDS.labels("delete_chunks").time():
                 cur.execute("DELETE FROM document_chunks WHERE document_id = %s", (document_id,))
             
             # Chunk the content
-            chunks = self.chunk_markdown(content, file_path)
+            chunks = self.chunk_markdown(content, file_path, title)
             logger.info(f"Created {len(chunks)} chunks for {file_path}")
             
             # Process chunks in batches
@@ -497,10 +573,14 @@ class DocumentProcessor:
                 self._process_chunk_batch(document_id, batch)
             
             logger.info(f"Successfully processed {file_path}")
+            self.snapshot_stale = True
+            metrics.DOCUMENTS.labels("processed").inc()
+            metrics.DOCUMENT_SECONDS.observe(time.perf_counter() - start)
             return True
             
         except Exception as e:
             logger.error(f"Error processing {file_path}: {e}")
+            metrics.DOCUMENTS.labels("failed").inc()
             return False
     
     def _extract_title(self, content: str, file_path: Path) -> str:
@@ -514,36 +594,46 @@ class DocumentProcessor:
         # Fallback to filename
         return file_path.stem.replace('_', ' ').replace('-', ' ').title()
     
+    @staticmethod
+    def _normalize(embedding: List[float]) -> List[float]:
+        """Scale an embedding to unit length"""
+        norm = math.sqrt(sum(x * x for x in embedding))
+        return [x / norm for x in embedding] if norm else embedding
+    
     def _process_chunk_batch(self, document_id: int, chunks: List[Dict[str, Any]]):
         """Process a batch of chunks"""
-        for chunk in chunks:
-            try:
-                # Generate embedding
-                embedding = self.generate_embedding(chunk['content'])
-                
-                # Convert embedding to pgvector format
-                embedding_str = '[' + ','.join(map(str, embedding)) + ']'
-                
-                # Insert chunk
-                with self.conn.cursor() as cur:
-                    cur.execute("""
-                        INSERT INTO document_chunks 
-                        (document_id, chunk_index, content, embedding, metadata)
-                        VALUES (%s, %s, %s, %s::vector, %s)
-                    """, (
-                        document_id,
-                        chunk['metadata']['chunk_index'],
-                        chunk['content'],
-                        embedding_str,
-                        json.dumps(chunk['metadata'])
-                    ))
-                
-                # Small delay to respect API rate limits
-                time.sleep(0.1)
-                
-            except Exception as e:
-                logger.error(f"Error processing chunk {chunk['metadata']['chunk_index']}: {e}")
-                raise
+        try:
+            # Generate embeddings for the whole batch
+            embeddings = self.generate_embeddings([chunk['content'] for chunk in chunks])
+            
+            if self.vector_metric == "ip":
+                embeddings = [self._normalize(embedding) for embedding in embeddings]
+            
+            rows = [
+                (
+                    document_id,
+                    chunk['metadata']['chunk_index'],
+                    chunk['content'],
+                    # Convert embedding to pgvector format
+                    '[' + ','.join(map(str, embedding)) + ']',
+                    json.dumps(chunk['metadata'])
+                )
+                for chunk, embedding in zip(chunks, embeddings)
+            ]
+            
+            # Insert chunks
+            with self.conn.cursor() as cur, metrics.DB_SECONDS.labels("insert_chunks").time():
+                execute_values(cur, """
+                    INSERT INTO document_chunks 
+                    (document_id, chunk_index, content, embedding, metadata)
+                    VALUES %s
+                """, rows, template="(%s, %s, %s, %s::vector, %s)")
+            metrics.CHUNKS.inc(len(rows))
+            
+        except Exception as e:
+            logger.error(f"Error processing chunks {chunks[0]['metadata']['chunk_index']}-"
+                         f"{chunks[-1]['metadata']['chunk_index']}: {e}")
+            raise
     
     def process_all_documents(self):
         """Process all markdown documents in the docs directory"""
@@ -567,6 +657,7 @@ class DocumentProcessor:
             try:
                 if self.is_file_processed(file_path):
                     logger.info(f"File {file_path} is up to date, skipping")
+                    metrics.DOCUMENTS.labels("skipped").inc()
                     skipped += 1
                     continue
                 
@@ -585,6 +676,29 @@ class DocumentProcessor:
         
         # Log summary statistics
         self._log_processing_stats()
+        
+        if self.snapshot_path and (self.snapshot_stale or not os.path.exists(self.snapshot_path)):
+            self.publish_snapshot()
+    
+    def publish_snapshot(self):
+        """Write the embedding snapshot; failures leave the previous one in place"""
+        # The /process handler and the watch loop both publish; one at a time,
+        # so an older snapshot never replaces a newer one
+        with self.snapshot_lock:
+            self.snapshot_stale = False
+            self.snapshot_published_at = time.time()
+            try:
+                write_snapshot(self.db_url, self.snapshot_path, self.snapshot_dtype)
+                metrics.SNAPSHOT_PUBLISHED.set_to_current_time()
+            except Exception as e:
+                self.snapshot_stale = True
+                logger.error(f"Error publishing embedding snapshot: {e}")
+    
+    def publish_snapshot_if_stale(self):
+        """Publish after changes, at most once per snapshot interval"""
+        if (self.snapshot_path and self.snapshot_stale and
+                time.time() - self.snapshot_published_at >= self.snapshot_interval):
+            self.publish_snapshot()
     
     def _log_processing_stats(self):
         """Log processing statistics"""
@@ -601,6 +715,25 @@ class DocumentProcessor:
                 
                 logger.info(f"Database statistics: {doc_count} documents, {chunk_count} chunks, avg {avg_words:.1f} words per chunk")
                 
+                # Chunk size distribution and overlap duplication, per size unit
+                cur.execute("""
+                    SELECT
+                        COALESCE(metadata->>'size_unit', 'chars') as size_unit,
+                        COUNT(*) as chunks,
+                        SUM(COALESCE((metadata->>'overlap')::int, 0))::float
+                            / NULLIF(SUM((metadata->>'size')::int), 0) as duplication_ratio,
+                        percentile_disc(0.5) WITHIN GROUP (ORDER BY (metadata->>'size')::int) as p50,
+                        percentile_disc(0.9) WITHIN GROUP (ORDER BY (metadata->>'size')::int) as p90,
+                        MAX((metadata->>'size')::int) as max_size
+                    FROM document_chunks
+                    GROUP BY 1
+                """)
+                for size_unit, chunks, duplication, p50, p90, max_size in cur.fetchall():
+                    logger.info(
+                        f"Chunk sizes ({size_unit}): {chunks} chunks, p50 {p50}, p90 {p90}, max {max_size}, "
+                        f"{(duplication or 0):.1%} duplicated by overlap"
+                    )
+                
         except Exception as e:
             logger.warning(f"Could not retrieve processing stats: {e}")
     
@@ -611,17 +744,25 @@ class DocumentProcessor:
             query_embedding = self.generate_embedding(query)
             embedding_str = '[' + ','.join(map(str, query_embedding)) + ']'
             
+            if self.vector_metric == "ip":
+                # <#> is the negative inner product
+                distance = "dc.embedding <#> %s::vector"
+                similarity = f"-({distance})"
+            else:
+                distance = "dc.embedding <=> %s::vector"
+                similarity = f"1 - ({distance})"
+            
             with self.conn.cursor(cursor_factory=RealDictCursor) as cur:
-                cur.execute("""
+                cur.execute(f"""
                     SELECT 
                         d.file_path,
                         d.title,
                         dc.content,
                         dc.metadata,
-                        1 - (dc.embedding <=> %s::vector) as similarity
+                        {similarity} as similarity
                     FROM document_chunks dc
                     JOIN documents d ON dc.document_id = d.id
-                    ORDER BY dc.embedding <=> %s::vector
+                    ORDER BY {distance}
                     LIMIT %s
                 """, (embedding_str, embedding_str, limit))
                 
@@ -811,6 +952,7 @@ def main():
         try:
             while True:
                 time.sleep(1)
+                processor.publish_snapshot_if_stale()
         except KeyboardInterrupt:
             logger.info("Shutting down document processor...")
             if observer.is_alive():
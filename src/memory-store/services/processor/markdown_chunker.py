@@ -0,0 +1,260 @@
+"""
+Single-pass markdown chunker for the document processor.
+
+The chunker walks the document once by line offsets, classifying each line
+with one precompiled pattern matched against the source string, and only
+slices text when a chunk is emitted. Sections (split on headers) and size-bounded chunks are
+produced in the same pass and yielded lazily.
+"""
+
+import json
+import logging
+import re
+from collections import deque
+from typing import Any, Callable, Dict, Iterator, List, Optional, Tuple
+
+import yaml
+
+logger = logging.getLogger(__name__)
+
+# One pattern classifies every line, so the document is scanned by a single
+# finditer() instead of stripping and matching each line separately.
+LINE_PATTERN = re.compile(r"""
+    [ \t]*
+    (?:
+        (?P<header>\#{1,6})[ \t]+(?P<title>\S[^\n]*)
+      | (?P<fence>```)[^\n]*
+      | (?P<table>\|[^\n]*\|)[ \t\r]*
+      | (?P<blank>)[ \t\r]*
+      | [^\n]*
+    )
+    (?:\n|\Z)
+""", re.VERBOSE)
+# Overlap never exceeds this fraction of the chunk size, however it is set
+MAX_OVERLAP_RATIO = 0.25
+
+FRONT_MATTER_PATTERN = re.compile(
+    r'\A---[ \t]*\r?\n(.*?\r?\n)??(?:---|\.\.\.)[ \t]*(?:\r?\n|\Z)',
+    re.DOTALL
+)
+
+
+def parse_front_matter(content: str) -> Tuple[Dict[str, Any], int]:
+    """Parse YAML front-matter, returning (metadata, offset of the body)"""
+    if not content.startswith('---'):
+        return {}, 0
+
+    match = FRONT_MATTER_PATTERN.match(content)
+    if not match:
+        return {}, 0
+
+    try:
+        data = yaml.safe_load(match.group(1) or '')
+    except yaml.YAMLError as e:
+        logger.warning(f"Invalid YAML front-matter, treating as content: {e}")
+        return {}, 0
+
+    if data is None:
+        return {}, match.end()
+    if not isinstance(data, dict):
+        return {}, 0
+
+    # Dates and other YAML scalars must survive json.dumps() into JSONB
+    return json.loads(json.dumps(data, default=str)), match.end()
+
+
+def iter_chunks(content: str, chunk_size: int, chunk_overlap: int, start: int = 0,
+                measure: Optional[Callable[[str], int]] = None,
+                max_size: Optional[int] = None) -> Iterator[Dict[str, Any]]:
+    """
+    Yield chunks of markdown content in a single pass.
+
+    Sections that fit in chunk_size are emitted whole ('complete_section').
+    Larger sections are split on blank lines outside code blocks and tables
+    ('section_part'). Headers inside fenced code blocks do not start new
+    sections.
+
+    Sizes are characters unless `measure` is given, in which case it is
+    called with each line (e.g. to count model tokens). chunk_overlap is in
+    the same unit: the next chunk starts with the trailing whole lines of
+    the previous one that fit in it, capped at MAX_OVERLAP_RATIO of
+    chunk_size. With `max_size`, a chunk is closed at its last safe blank
+    line before it would grow past max_size, or at the current line if
+    there is none, so chunks can be packed up to a hard limit.
+    """
+    end_of_content = len(content)
+    overlap = min(chunk_overlap, int(chunk_size * MAX_OVERLAP_RATIO))
+
+    header = ""
+    level = 0
+    section_start = start
+    section_size = 0
+    section_split = False
+
+    chunk_start = start
+    chunk_size_so_far = 0
+    chunk_overlap_size = 0
+    chunk_new_lines = 0
+    # (offset, size) of the trailing lines of the chunk that fit in overlap
+    recent_lines = deque()
+    recent_size = 0
+    # The chunk at its last safe split: end offset, size, new lines, and the
+    # overlap that would carry over from there
+    boundary = None
+    boundary_size = 0
+    boundary_new_lines = 0
+    boundary_overlap_start = 0
+    boundary_overlap_size = 0
+
+    in_code_block = False
+    in_table = False
+
+    def make_chunk(text_start: int, text_end: int, size: int, overlap_size: int, chunk_type: str):
+        text = content[text_start:text_end].strip()
+        if not text:
+            return None
+        return {
+            'content': text,
+            'metadata': {
+                'header': header,
+                'header_level': level,
+                'size': size,
+                'overlap': overlap_size,
+                'chunk_type': chunk_type
+            }
+        }
+
+    def close_section(section_end: int):
+        if not section_split and section_size <= chunk_size:
+            return make_chunk(section_start, section_end, section_size, 0, 'complete_section')
+        if chunk_new_lines:
+            return make_chunk(chunk_start, section_end, chunk_size_so_far, chunk_overlap_size, 'section_part')
+        return None
+
+    for line in LINE_PATTERN.finditer(content, start):
+        pos, next_pos = line.span()
+        if pos == next_pos:
+            break
+        line_size = measure(content[pos:next_pos]) if measure else next_pos - pos
+        kind = line.lastgroup
+
+        if kind == 'title' and not in_code_block:
+            chunk = close_section(pos)
+            if chunk:
+                yield chunk
+
+            header = line.group('title').strip()
+            level = len(line.group('header'))
+            section_start = chunk_start = pos
+            section_size = chunk_size_so_far = chunk_overlap_size = chunk_new_lines = 0
+            section_split = False
+            recent_lines.clear()
+            recent_size = 0
+            boundary = None
+            in_table = False
+
+        # Close the chunk before this line would push it past the hard limit
+        while max_size and chunk_new_lines and chunk_size_so_far + line_size > max_size:
+            if boundary is not None and boundary_new_lines:
+                split_at, split_size, split_lines = boundary, boundary_size, boundary_new_lines
+                carry_start, carry_size = boundary_overlap_start, boundary_overlap_size
+            else:
+                split_at, split_size, split_lines = pos, chunk_size_so_far, chunk_new_lines
+                carry_start, carry_size = (recent_lines[0][0], recent_size) if recent_lines else (pos, 0)
+
+            chunk = make_chunk(chunk_start, split_at, split_size, chunk_overlap_size, 'section_part')
+            if chunk:
+                yield chunk
+            section_split = True
+
+            # Only carry overlap if it still leaves room for this line
+            remainder = chunk_size_so_far - split_size
+            if carry_size + remainder + line_size > max_size:
+                carry_start, carry_size = split_at, 0
+            chunk_start = carry_start
+            chunk_size_so_far = carry_size + remainder
+            chunk_overlap_size = carry_size
+            chunk_new_lines -= split_lines
+            while recent_lines and recent_lines[0][0] < chunk_start:
+                recent_size -= recent_lines.popleft()[1]
+            boundary = None
+
+        if kind == 'fence':
+            in_code_block = not in_code_block
+
+        is_blank = kind == 'blank'
+        if kind == 'table':
+            in_table = True
+        elif in_table and is_blank:
+            in_table = False
+
+        section_size += line_size
+        chunk_size_so_far += line_size
+        chunk_new_lines += 1
+        if overlap:
+            recent_lines.append((pos, line_size))
+            recent_size += line_size
+            while recent_size > overlap:
+                recent_size -= recent_lines.popleft()[1]
+
+        safe_split = is_blank and not in_code_block and not in_table
+
+        # Split on blank lines, never inside code blocks or tables
+        if chunk_size_so_far > chunk_size and safe_split:
+            chunk = make_chunk(chunk_start, next_pos, chunk_size_so_far, chunk_overlap_size, 'section_part')
+            if chunk:
+                yield chunk
+            section_split = True
+            boundary = None
+
+            # Start new chunk with the trailing lines that fit in the overlap
+            if recent_lines:
+                chunk_start = recent_lines[0][0]
+                chunk_size_so_far = chunk_overlap_size = recent_size
+            else:
+                chunk_start = next_pos
+                chunk_size_so_far = chunk_overlap_size = 0
+            chunk_new_lines = 0
+        elif safe_split:
+            boundary = next_pos
+            boundary_size = chunk_size_so_far
+            boundary_new_lines = chunk_new_lines
+            boundary_overlap_start = recent_lines[0][0] if recent_lines else next_pos
+            boundary_overlap_size = recent_size
+
+    chunk = close_section(end_of_content)
+    if chunk:
+        yield chunk
+
+
+def summarize_chunks(chunk_sizes: List[int], overlap_sizes: List[int],
+                     source_size: int) -> Dict[str, Any]:
+    """
+    Corpus-level chunking report: chunk count, size distribution, and how
+    much of the chunked text is overlap duplicated from a previous chunk.
+    """
+    if not chunk_sizes:
+        return {'chunks': 0, 'source_size': source_size}
+
+    sizes = sorted(chunk_sizes)
+    total = sum(sizes)
+    duplicated = sum(overlap_sizes)
+
+    def percentile(p: float) -> int:
+        return sizes[min(len(sizes) - 1, int(p * len(sizes)))]
+
+    return {
+        'chunks': len(sizes),
+        'source_size': source_size,
+        'chunked_size': total,
+        # Share of chunked text that repeats the previous chunk
+        'duplication_ratio': duplicated / total if total else 0.0,
+        # Chunked text relative to the source (1.0 = no duplication)
+        'expansion': total / source_size if source_size else 0.0,
+        'size_min': sizes[0],
+        'size_mean': total / len(sizes),
+        'size_p50': percentile(0.50),
+        'size_p90': percentile(0.90),
+        'size_p99': percentile(0.99),
+        'size_max': sizes[-1],
+    }
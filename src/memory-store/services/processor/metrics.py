@@ -0,0 +1,32 @@
+"""
+Prometheus metrics for the document processor, served by the health check
+server at /metrics.
+"""
+
+from prometheus_client import CONTENT_TYPE_LATEST, Counter, Gauge, Histogram, generate_latest
+
+DOCUMENTS = Counter("processor_documents_total", "Documents seen by outcome", ["outcome"])
+DOCUMENT_SECONDS = Histogram(
+    "processor_document_seconds", "Time to chunk, embed and store one document",
+    buckets=(0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0))
+CHUNKS = Counter("processor_chunks_ingested_total", "Chunks embedded and inserted")
+
+EMBEDDING_REQUEST_SECONDS = Histogram(
+    "processor_embedding_request_seconds", "/embeddings round trips to the embedding service",
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0))
+EMBEDDING_REQUEST_TEXTS = Histogram(
+    "processor_embedding_request_texts", "Texts per /embeddings request",
+    buckets=(1, 5, 10, 25, 50, 100, 250, 500, 1000))
+EMBEDDING_RETRIES = Counter(
+    "processor_embedding_retries_total", "/embeddings requests retried, by reason", ["reason"])
+
+DB_SECONDS = Histogram(
+    "processor_db_query_seconds", "Document and chunk writes by operation", ["operation"],
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0))
+
+SNAPSHOT_PUBLISHED = Gauge(
+    "processor_snapshot_published_timestamp_seconds", "When the embedding snapshot was last published")
+
+
+def render() -> bytes:
+    return generate_latest()
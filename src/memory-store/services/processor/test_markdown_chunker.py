@@ -0,0 +1,259 @@
+#!/usr/bin/env python3
+"""
+Unit tests for the single-pass markdown chunker.
+
+Covers front-matter parsing, sections kept whole or split on blank lines,
+fenced code blocks and tables that are never split, header metadata, the
+overlap cap, and sizing by a caller's measure up to a hard max_size. Pure
+functions, no services needed:
+
+    python -m pytest -q test_markdown_chunker.py
+"""
+
+import unittest
+
+from bench_chunking import generate_corpus, single_pass_chunk_markdown
+from markdown_chunker import MAX_OVERLAP_RATIO, iter_chunks, parse_front_matter
+
+
+def paragraphs(count: int, words: int = 12, prefix: str = "word") -> str:
+    """count blank-line separated paragraphs of distinct words"""
+    return "\n\n".join(
+        " ".join(f"{prefix}{p}_{w}" for w in range(words)) for p in range(count)
+    ) + "\n"
+
+
+def words(line: str) -> int:
+    """A stand-in for a tokenizer's per-line count"""
+    return len(line.split())
+
+
+class ChunkAssertions(unittest.TestCase):
+    """Assertions shared by the chunking tests"""
+
+    def assertCovers(self, content, chunks):
+        """Every non-blank line of content is in some chunk, and chunks come in source order"""
+        texts = [chunk["content"] for chunk in chunks]
+        for line in content.splitlines():
+            if line.strip():
+                self.assertTrue(any(line.strip() in text for text in texts), line)
+        position = 0
+        for text in texts:
+            found = content.find(text, position)
+            self.assertGreaterEqual(found, 0, text[:80])
+            position = found
+
+
+class TestFrontMatter(unittest.TestCase):
+    """parse_front_matter() and chunking after it"""
+
+    def test_metadata_and_body_offset(self):
+        content = "---\ntitle: Guide\ntags: [a, b]\n---\n# Intro\n\nBody text.\n"
+        metadata, body_start = parse_front_matter(content)
+        self.assertEqual(metadata, {"title": "Guide", "tags": ["a", "b"]})
+        self.assertEqual(content[body_start:], "# Intro\n\nBody text.\n")
+
+    def test_dates_become_strings(self):
+        metadata, _ = parse_front_matter("---\ndate: 2024-01-15\n---\nBody\n")
+        self.assertEqual(metadata, {"date": "2024-01-15"})
+
+    def test_dots_terminator_and_empty_block(self):
+        content = "---\ntitle: Guide\n...\nBody\n"
+        metadata, body_start = parse_front_matter(content)
+        self.assertEqual(metadata, {"title": "Guide"})
+        self.assertEqual(content[body_start:], "Body\n")
+
+        metadata, body_start = parse_front_matter("---\n---\nBody\n")
+        self.assertEqual((metadata, body_start), ({}, 8))
+
+    def test_not_front_matter(self):
+        for content in [
+            "# No front matter\n",
+            "---\nnot closed\n",
+            "---\n- a list\n- not a mapping\n---\nBody\n",
+            "---\ntitle: [unclosed\n---\nBody\n",
+        ]:
+            with self.subTest(content=content):
+                self.assertEqual(parse_front_matter(content), ({}, 0))
+
+    def test_chunks_start_after_front_matter(self):
+        content = "---\ntitle: Guide\n---\n# Intro\n\nBody text.\n"
+        _, body_start = parse_front_matter(content)
+        chunks = list(iter_chunks(content, 512, 50, start=body_start))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["content"], "# Intro\n\nBody text.")
+        self.assertNotIn("title: Guide", chunks[0]["content"])
+
+
+class TestSections(ChunkAssertions):
+    """Header sections, their metadata, and splitting on blank lines"""
+
+    def test_small_sections_are_one_chunk_each(self):
+        content = (
+            "Preamble before any header.\n\n"
+            "# Guide\n\nIntro paragraph.\n\n"
+            "## Install\n\nRun the installer.\n\n"
+            "### Linux\n\nUse the package.\n\n"
+            "## Usage\n\nStart the service.\n"
+        )
+        chunks = list(iter_chunks(content, 512, 50))
+        self.assertEqual(
+            [(c["metadata"]["header"], c["metadata"]["header_level"]) for c in chunks],
+            [("", 0), ("Guide", 1), ("Install", 2), ("Linux", 3), ("Usage", 2)]
+        )
+        for chunk in chunks:
+            self.assertEqual(chunk["metadata"]["chunk_type"], "complete_section")
+            self.assertEqual(chunk["metadata"]["overlap"], 0)
+        self.assertEqual(chunks[2]["content"], "## Install\n\nRun the installer.")
+
+    def test_large_section_splits_on_blank_lines(self):
+        content = "# Big\n\n" + paragraphs(20)
+        chunks = list(iter_chunks(content, 300, 0))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertEqual(chunk["metadata"]["chunk_type"], "section_part")
+            self.assertEqual(chunk["metadata"]["header"], "Big")
+            # Paragraphs are never cut in the middle
+            for paragraph in chunk["content"].split("\n\n"):
+                self.assertIn(paragraph, content)
+        # Without overlap the parts cover the section exactly once
+        self.assertEqual("\n\n".join(c["content"] for c in chunks), content.strip())
+
+    def test_headers_in_code_blocks_do_not_start_sections(self):
+        content = "# Real\n\n```bash\n# not a header\necho hi\n```\n\nAfter the code.\n"
+        chunks = list(iter_chunks(content, 512, 0))
+        self.assertEqual(len(chunks), 1)
+        self.assertEqual(chunks[0]["metadata"]["header"], "Real")
+        self.assertIn("# not a header", chunks[0]["content"])
+
+
+class TestUnsplittableBlocks(unittest.TestCase):
+    """Fenced code and tables larger than the chunk size stay whole"""
+
+    def test_code_block_longer_than_chunk_size(self):
+        code = "```python\n" + "\n\n".join(f"value_{i} = compute({i})" for i in range(40)) + "\n```\n"
+        content = "# Code\n\n" + paragraphs(2) + "\n" + code + "\n" + paragraphs(2, prefix="after")
+        self.assertGreater(len(code), 4 * 200)
+
+        chunks = list(iter_chunks(content, 200, 0))
+        with_code = [c for c in chunks if "```" in c["content"]]
+        self.assertEqual(len(with_code), 1)
+        self.assertIn(code.strip(), with_code[0]["content"])
+        self.assertGreater(with_code[0]["metadata"]["size"], 200)
+
+    def test_table_longer_than_chunk_size(self):
+        rows = ["| name | value |", "|------|-------|"] + [f"| row{i} | {i * 7} |" for i in range(30)]
+        table = "\n".join(rows) + "\n"
+        content = "# Table\n\n" + paragraphs(2) + "\n" + table + "\n" + paragraphs(2, prefix="after")
+        self.assertGreater(len(table), 2 * 200)
+
+        chunks = list(iter_chunks(content, 200, 0))
+        with_table = [c for c in chunks if "| name | value |" in c["content"]]
+        self.assertEqual(len(with_table), 1)
+        self.assertIn(table.strip(), with_table[0]["content"])
+
+
+class TestOverlap(ChunkAssertions):
+    """Overlap carried between the parts of a split section"""
+
+    def test_overlap_capped_at_max_ratio(self):
+        chunk_size = 200
+        content = "# Overlap\n\n" + paragraphs(30, words=4)
+        chunks = list(iter_chunks(content, chunk_size, chunk_overlap=10_000))
+        self.assertGreater(len(chunks), 2)
+        cap = int(chunk_size * MAX_OVERLAP_RATIO)
+        for previous, chunk in zip(chunks, chunks[1:]):
+            overlap = chunk["metadata"]["overlap"]
+            self.assertGreater(overlap, 0)
+            self.assertLessEqual(overlap, cap)
+            # The overlap is whole trailing lines of the previous part
+            carried = chunk["content"].split("\n\n")[0]
+            self.assertTrue(previous["content"].endswith(carried))
+
+    def test_no_overlap(self):
+        content = "# Overlap\n\n" + paragraphs(30, words=4)
+        for chunk in iter_chunks(content, 200, chunk_overlap=0):
+            self.assertEqual(chunk["metadata"]["overlap"], 0)
+
+
+class TestMeasure(ChunkAssertions):
+    """Sizes in a caller's unit (e.g. model tokens) and the max_size hard limit"""
+
+    def test_sizes_in_measure_units(self):
+        content = "# Big\n\n" + paragraphs(20)
+        chunks = list(iter_chunks(content, 50, 0, measure=words))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertEqual(chunk["metadata"]["size"], words(chunk["content"]))
+            # Closed at the first blank line past chunk_size: one paragraph over at most
+            self.assertLessEqual(chunk["metadata"]["size"], 50 + 12)
+        self.assertCovers(content, chunks)
+
+    def test_overlap_in_measure_units(self):
+        content = "# Big\n\n" + paragraphs(20, words=4)
+        chunks = list(iter_chunks(content, 40, 100, measure=words))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks[1:]:
+            self.assertGreater(chunk["metadata"]["overlap"], 0)
+            self.assertLessEqual(chunk["metadata"]["overlap"], int(40 * MAX_OVERLAP_RATIO))
+
+    def test_max_size_is_a_hard_limit(self):
+        code = "```bash\n" + "\n".join(f"kubectl get pod{i}" for i in range(30)) + "\n```\n"
+        content = "# Deploy\n\n" + paragraphs(4) + "\n" + code + "\n" + paragraphs(4, prefix="after")
+        self.assertGreater(words(code), 40)
+
+        chunks = list(iter_chunks(content, 40, 10, measure=words, max_size=40))
+        for chunk in chunks:
+            self.assertLessEqual(chunk["metadata"]["size"], 40)
+            self.assertLessEqual(chunk["metadata"]["overlap"], 10)
+        # The code block is longer than the limit, so it is cut between lines
+        self.assertTrue(any(chunk["content"].count("```") % 2 for chunk in chunks))
+        self.assertCovers(content, chunks)
+
+    def test_max_size_prefers_blank_lines(self):
+        content = "# Big\n\n" + paragraphs(20, words=6)
+        chunks = list(iter_chunks(content, 40, 0, measure=words, max_size=40))
+        self.assertGreater(len(chunks), 1)
+        for chunk in chunks:
+            self.assertLessEqual(chunk["metadata"]["size"], 40)
+        # Without overlap the parts cover the section exactly once, split between paragraphs
+        self.assertEqual("\n\n".join(c["content"] for c in chunks), content.strip())
+
+
+class TestBenchmarkCorpus(ChunkAssertions):
+    """The chunker as the processor drives it, over bench_chunking's synthetic corpus"""
+
+    def test_sections_and_code_blocks(self):
+        for content in generate_corpus(10, seed=7):
+            _, body_start = parse_front_matter(content)
+            body = content[body_start:]
+            headers, in_fence = {""}, False
+            for line in body.splitlines():
+                if line.startswith("```"):
+                    in_fence = not in_fence
+                elif line.startswith("#") and not in_fence:
+                    headers.add(line.lstrip("#").strip())
+
+            chunks = single_pass_chunk_markdown(content, 512, 0)
+            for chunk in chunks:
+                # No section starts at a "# comment" inside a code block
+                self.assertIn(chunk["metadata"]["header"], headers)
+                # Code blocks are never split (overlap may repeat a block's tail)
+                self.assertEqual(chunk["content"].count("```") % 2, 0)
+            self.assertCovers(body, chunks)
+
+    def test_overlap_within_cap(self):
+        cap = int(512 * MAX_OVERLAP_RATIO)
+        overlapped = 0
+        for content in generate_corpus(10, seed=7):
+            _, body_start = parse_front_matter(content)
+            chunks = single_pass_chunk_markdown(content, 512, 200)
+            for chunk in chunks:
+                self.assertLessEqual(chunk["metadata"]["overlap"], cap)
+                overlapped += chunk["metadata"]["overlap"] > 0
+            self.assertCovers(content[body_start:], chunks)
+        self.assertGreater(overlapped, 0)
+
+
+if __name__ == "__main__":
+    unittest.main()